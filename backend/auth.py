@@ -0,0 +1,17 @@
+# backend/auth.py
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Dependency for /admin endpoints.
+    If ADMIN_TOKEN is set, the request must send it in the X-Admin-Token header.
+    (Without ADMIN_TOKEN the admin endpoints stay open, as in local development.)
+    """
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
@@ -0,0 +1,223 @@
+# backend/availability.py
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from pymongo import ASCENDING
+
+from backend.database import db
+
+# Seconds a per-port availability matrix is reused before reloading from Mongo
+AVAILABILITY_CACHE_TTL = float(os.getenv("AVAILABILITY_CACHE_TTL", "60"))
+# Minimum number of days loaded per port, so nearby searches share one matrix
+AVAILABILITY_MIN_DAYS = int(os.getenv("AVAILABILITY_MIN_DAYS", "400"))
+
+
+def berth_key(doc: Dict) -> str:
+    """
+    Berth identity of an occupancy row. Rows without berth_id (written by
+    older versions of the mock seed) are grouped into one pseudo-berth per
+    boat_length; they can be quoted but not booked.
+    """
+    return doc.get("berth_id") or f"{doc['boat_length']:g}m"
+
+
+class PortAvailability:
+    """
+    Compact availability of one port: a boolean matrix (berths x days),
+    True = free, starting at `start`. Days without an occupancy row count as taken.
+    Berths without a known beam have beam = inf (any boat fits).
+    """
+
+    def __init__(self, port_name: str, start: date, days: int, berth_ids: List[str],
+                 berth_lengths: np.ndarray, berth_beams: np.ndarray, free: np.ndarray):
+        self.port_name = port_name
+        self.start = start
+        self.days = days
+        self.berth_ids = berth_ids
+        self.berth_lengths = berth_lengths
+        self.berth_beams = berth_beams
+        self.free = free
+        self.loaded_at = time.monotonic()
+
+    @property
+    def end(self) -> date:
+        return self.start + timedelta(days=self.days)
+
+    def covers(self, start: date, end: date) -> bool:
+        return self.start <= start and end <= self.end
+
+    @classmethod
+    def load(cls, port_name: str, start: date, end: date) -> "PortAvailability":
+        days = (end - start).days
+        cursor = db.occupancy.find(
+            {
+                "port_name": port_name,
+                "date": {"$gte": datetime.combine(start, datetime.min.time()),
+                         "$lt": datetime.combine(end, datetime.min.time())}
+            },
+            {"_id": 0, "berth_id": 1, "boat_length": 1, "beam": 1, "date": 1, "available": 1},
+            batch_size=10000
+        )
+
+        berth_of: Dict[str, int] = {}
+        lengths: List[float] = []
+        beams: List[float] = []
+        rows, cols = [], []
+        for doc in cursor:
+            if not doc.get("available"):
+                continue
+            key = berth_key(doc)
+            b = berth_of.get(key)
+            if b is None:
+                b = berth_of[key] = len(lengths)
+                lengths.append(float(doc["boat_length"]))
+                beams.append(float(doc.get("beam") or np.inf))
+            rows.append(b)
+            cols.append((doc["date"].date() - start).days)
+
+        free = np.zeros((len(lengths), days), dtype=np.bool_)
+        if rows:
+            free[np.array(rows), np.array(cols)] = True
+        return cls(port_name, start, days, list(berth_of), np.array(lengths, dtype=np.float64),
+                   np.array(beams, dtype=np.float64), free)
+
+    def earliest_window(self, boat_length: float, nights: int, after: date, until: date) -> Optional[Dict]:
+        """
+        First run of `nights` consecutive free nights, starting on or after `after`
+        and ending by `until`, on any berth long enough for the boat.
+        Sliding-window sum over the day axis; when several berths are free on
+        that day, the shortest berth that fits wins (keeps big berths for big boats).
+        """
+        fits = np.flatnonzero(self.berth_lengths >= boat_length)
+        lo = max((after - self.start).days, 0)
+        hi = min((until - self.start).days, self.days)
+        if fits.size == 0 or hi - lo < nights:
+            return None
+
+        window = self.free[fits, lo:hi].astype(np.int32)
+        csum = np.zeros((window.shape[0], window.shape[1] + 1), dtype=np.int32)
+        np.cumsum(window, axis=1, out=csum[:, 1:])
+        full = (csum[:, nights:] - csum[:, :-nights]) == nights  # berths x start days
+
+        any_berth = full.any(axis=0)
+        if not any_berth.any():
+            return None
+        day = int(np.argmax(any_berth))
+        candidates = fits[full[:, day]]
+        berth = candidates[np.argmin(self.berth_lengths[candidates])]
+
+        start_date = self.start + timedelta(days=lo + day)
+        return {
+            "port_name": self.port_name,
+            "berth_id": self.berth_ids[berth],
+            "berth_length": float(self.berth_lengths[berth]),
+            "start_date": start_date,
+            "end_date": start_date + timedelta(days=nights),
+            "nights": nights,
+        }
+
+
+    def fits(self, boat_length: float, beam: Optional[float] = None) -> np.ndarray:
+        """
+        Mask of the berths long (and, if beam is given, wide) enough for the boat.
+        """
+        mask = self.berth_lengths >= boat_length
+        if beam:
+            mask &= self.berth_beams >= beam
+        return mask
+
+    def berth_fits(self, berth_id: str, boat_length: float, beam: Optional[float] = None) -> bool:
+        return bool(self.fits(boat_length, beam)[self.berth_ids.index(berth_id)])
+
+    def free_berths(self, boat_length: float, start: date, end: date, beam: Optional[float] = None) -> List[str]:
+        """
+        Berths big enough for the boat that look free every night of [start, end),
+        shortest first. Only a hint: bookings claim the nights in Mongo.
+        """
+        lo = (start - self.start).days
+        hi = (end - self.start).days
+        fits = np.flatnonzero(self.fits(boat_length, beam) & self.free[:, lo:hi].all(axis=1))
+        return [self.berth_ids[b] for b in fits[np.argsort(self.berth_lengths[fits], kind="stable")]]
+
+    def mark(self, berth_id: str, start: date, end: date, free: bool):
+        if berth_id not in self.berth_ids:
+            return
+        lo = max((start - self.start).days, 0)
+        hi = min((end - self.start).days, self.days)
+        if hi > lo:
+            self.free[self.berth_ids.index(berth_id), lo:hi] = free
+
+
+_cache: Dict[str, PortAvailability] = {}
+_lock = threading.Lock()
+_indexes_ready = False
+
+
+def ensure_occupancy_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        db.occupancy.create_index([("port_name", ASCENDING), ("date", ASCENDING)])
+        _indexes_ready = True
+
+
+def get_port_availability(port_name: str, start: date, end: date) -> PortAvailability:
+    """
+    Cached availability matrix of a port covering [start, end).
+    Reloaded when older than AVAILABILITY_CACHE_TTL, invalidated, or too short.
+    """
+    entry = _cache.get(port_name)
+    if entry and entry.covers(start, end) and time.monotonic() - entry.loaded_at < AVAILABILITY_CACHE_TTL:
+        return entry
+
+    with _lock:
+        entry = _cache.get(port_name)
+        if entry and entry.covers(start, end) and time.monotonic() - entry.loaded_at < AVAILABILITY_CACHE_TTL:
+            return entry
+        ensure_occupancy_indexes()
+        end = max(end, start + timedelta(days=AVAILABILITY_MIN_DAYS))
+        entry = _cache[port_name] = PortAvailability.load(port_name, start, end)
+        return entry
+
+
+def invalidate(port_name: Optional[str] = None):
+    """
+    Drop cached availability (one port or all), e.g. after bookings or imports.
+    """
+    if port_name is None:
+        _cache.clear()
+    else:
+        _cache.pop(port_name, None)
+
+
+def mark(port_name: str, berth_id: str, start: date, end: date, free: bool):
+    """
+    Patch this worker's cached matrix after a booking or cancellation
+    instead of reloading the whole port.
+    """
+    entry = _cache.get(port_name)
+    if entry is not None:
+        entry.mark(berth_id, start, end, free)
+
+
+def occupancy_ports() -> List[str]:
+    return sorted(db.occupancy.distinct("port_name"))
+
+
+def earliest_windows(ports: Optional[List[str]], boat_length: float, nights: int,
+                     after: date, horizon_days: int) -> List[Dict]:
+    """
+    Earliest window per port (ports without one are left out), sorted by start date.
+    """
+    until = after + timedelta(days=horizon_days + nights)
+    results = []
+    for port_name in (ports if ports is not None else occupancy_ports()):
+        availability = get_port_availability(port_name, after, until)
+        window = availability.earliest_window(boat_length, nights, after, until)
+        if window:
+            results.append(window)
+    results.sort(key=lambda w: (w["start_date"], w["port_name"]))
+    return results
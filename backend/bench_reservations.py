@@ -0,0 +1,138 @@
+# backend/bench_reservations.py
+"""
+Contention benchmark for reservation booking.
+
+Many parallel clients book random short stays inside a small "hot" window,
+so most of them compete for the same berth-nights. Afterwards the occupancy
+collection is checked for double bookings.
+
+Run it against a throwaway database (e.g. one loaded with backend.synthetic):
+    python -m backend.bench_reservations --port "Puerto Sintetico 001" \
+        --clients 64 --bookings 2000 --start 2025-07-01 --hot-days 14
+    python -m backend.bench_reservations ... --url http://localhost:8000   # through the API
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from backend.database import db
+
+
+def _book_direct(payload: Dict) -> str:
+    from backend import reservations
+
+    try:
+        reservations.book(
+            payload["port_name"], payload["boat_length"],
+            date.fromisoformat(payload["arrival_date"]), date.fromisoformat(payload["departure_date"])
+        )
+        return "booked"
+    except reservations.NoBerthAvailable:
+        return "conflict"
+
+
+def _book_http(session, url: str, payload: Dict) -> str:
+    response = session.post(f"{url}/reservations", json=payload, timeout=30)
+    if response.status_code == 201:
+        return "booked"
+    if response.status_code == 409:
+        return "conflict"
+    return f"http_{response.status_code}"
+
+
+def run(port_name: str, clients: int, bookings: int, start: date, hot_days: int,
+        max_nights: int, boat_length: float, url: str = None, seed: int = 0) -> Dict:
+    rng = random.Random(seed)
+    payloads = []
+    for _ in range(bookings):
+        arrival = start + timedelta(days=rng.randrange(hot_days))
+        departure = arrival + timedelta(days=rng.randint(1, max_nights))
+        payloads.append({"port_name": port_name, "boat_length": boat_length,
+                         "arrival_date": arrival.isoformat(), "departure_date": departure.isoformat()})
+
+    local = threading.local()
+
+    def one(payload: Dict):
+        started = time.perf_counter()
+        if url:
+            import requests
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            outcome = _book_http(local.session, url, payload)
+        else:
+            outcome = _book_direct(payload)
+        return outcome, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(one, payloads))
+    elapsed = time.perf_counter() - started
+
+    outcomes: Dict[str, int] = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    latencies = sorted(latency for _, latency in results)
+    return {
+        "clients": clients,
+        "requests": bookings,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(bookings / elapsed, 1),
+        "outcomes": outcomes,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+        "double_booked": check_double_bookings(port_name),
+    }
+
+
+def check_double_bookings(port_name: str) -> List[Dict]:
+    """
+    Berth-nights claimed by more than one confirmed reservation, and
+    confirmed reservations whose nights are not all claimed by them.
+    Both lists must be empty.
+    """
+    problems = []
+    claimed = db.occupancy.aggregate([
+        {"$match": {"port_name": port_name, "reservation_id": {"$exists": True}}},
+        {"$group": {"_id": "$reservation_id", "nights": {"$sum": 1}}},
+    ])
+    claimed_by = {doc["_id"]: doc["nights"] for doc in claimed}
+    for reservation in db.reservations.find({"port_name": port_name, "status": "confirmed"}):
+        if claimed_by.get(reservation["_id"]) != reservation["nights"]:
+            problems.append({"reservation_id": reservation["_id"], "nights": reservation["nights"],
+                             "claimed": claimed_by.get(reservation["_id"], 0)})
+    overlaps = db.reservations.aggregate([
+        {"$match": {"port_name": port_name, "status": "confirmed"}},
+        {"$group": {"_id": "$berth_id", "stays": {"$push": {"a": "$arrival_date", "d": "$departure_date"}}}},
+    ])
+    for berth in overlaps:
+        stays = sorted(berth["stays"], key=lambda s: s["a"])
+        for prev, cur in zip(stays, stays[1:]):
+            if cur["a"] < prev["d"]:
+                problems.append({"berth_id": berth["_id"], "overlap": [prev, cur]})
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel reservation booking benchmark.")
+    parser.add_argument("--port", required=True, help="port_name with berth-level occupancy data")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--start", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--hot-days", type=int, default=14, help="arrivals fall in this many days")
+    parser.add_argument("--max-nights", type=int, default=5)
+    parser.add_argument("--boat-length", type=float, default=10.0)
+    parser.add_argument("--url", default=None, help="book through the API instead of calling Mongo directly")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = run(args.port, args.clients, args.bookings, args.start, args.hot_days,
+                 args.max_nights, args.boat_length, args.url, args.seed)
+    print(f"[{datetime.now()}] {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# backend/compression.py
+import os
+
+from starlette.middleware.gzip import GZipMiddleware
+
+# Bodies smaller than this are sent as-is
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1000"))
+
+EVENT_STREAM = b"text/event-stream"
+# Responses streamed as they happen (SSE, import progress): never buffered by a compressor
+STREAMING_PATHS = ("/events", "/admin/occupancy/import")
+
+
+def _wants_event_stream(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"accept":
+            return EVENT_STREAM in value
+    return False
+
+
+class CompressionMiddleware:
+    """
+    Brotli (br) when the client accepts it, otherwise gzip, for responses of
+    at least COMPRESSION_MIN_SIZE bytes. Falls back to gzip only when
+    brotli-asgi is not installed.
+    Server-sent event streams and import progress are passed through
+    untouched: a compressor would buffer them instead of sending each line
+    as it happens.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        try:
+            from brotli_asgi import BrotliMiddleware
+            self.compressed = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        except ImportError:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _wants_event_stream(scope) or scope["path"] in STREAMING_PATHS:
+            await self.app(scope, receive, send)
+        else:
+            await self.compressed(scope, receive, send)
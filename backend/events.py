@@ -0,0 +1,217 @@
+# backend/events.py
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from backend.database import db
+
+# Size of the capped 'events' collection (oldest events are overwritten)
+EVENTS_CAP_BYTES = int(os.getenv("EVENTS_CAP_BYTES", str(16 * 1024 * 1024)))
+# Seconds between SSE keep-alive comments on an idle stream
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+# Events buffered per SSE client before the oldest are dropped
+EVENTS_QUEUE_SIZE = 1000
+
+TARIFFS_PUBLISHED = "tariffs.published"
+AVAILABILITY_CHANGED = "availability.changed"
+
+
+_collection_ready = False
+
+
+def ensure_events_collection():
+    """
+    Create the capped 'events' collection before anything is written to it:
+    a plain insert would create an uncapped collection, which tailable
+    cursors reject. An existing uncapped one (e.g. written by an older
+    version) is converted in place.
+    """
+    global _collection_ready
+    if _collection_ready:
+        return
+    if "events" not in db.list_collection_names():
+        try:
+            db.create_collection("events", capped=True, size=EVENTS_CAP_BYTES)
+        except CollectionInvalid:
+            pass  # created by another worker meanwhile
+    if not db.events.options().get("capped"):
+        print(f"[{datetime.now()}] 'events' collection is not capped; converting it.")
+        db.command("convertToCapped", "events", size=EVENTS_CAP_BYTES)
+    _collection_ready = True
+
+
+def publish(event_type: str, **data):
+    """
+    Append an event to the capped 'events' collection. Every worker tails it,
+    so subscribers of all workers (and replicas) receive it within about a second.
+    """
+    try:
+        ensure_events_collection()
+        db.events.insert_one({"type": event_type, "ts": datetime.utcnow(), **data})
+    except PyMongoError as e:
+        # Clients fall back to their next poll; never fail the write that triggered it
+        print(f"[{datetime.now()}] Could not publish {event_type} event: {e}")
+
+
+def to_sse(event: Dict) -> str:
+    data = {k: v for k, v in event.items() if k != "_id"}
+    data["ts"] = data["ts"].isoformat()
+    return f"id: {event['_id']}\nevent: {event['type']}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventBroker:
+    """
+    One tailable cursor per worker on the 'events' collection, fanned out to:
+      - in-process handlers (called from the tailing thread), and
+      - asyncio queues of the SSE clients connected to this worker.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+        self._handlers: Dict[str, List[Callable[[Dict], None]]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def on(self, event_type: str, handler: Callable[[Dict], None]):
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                ensure_events_collection()
+                self._thread = threading.Thread(target=self._tail, name="events-tail", daemon=True)
+                self._thread.start()
+
+    def subscribe(self) -> asyncio.Queue:
+        self.start()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: Dict):
+        # Runs on the subscriber's loop. A client that stopped reading loses its oldest events.
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def _dispatch(self, event: Dict):
+        for handler in self._handlers.get(event["type"], ()):
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"[{datetime.now()}] Event handler for {event['type']} failed: {e}")
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                self.unsubscribe(queue)  # loop closed
+
+    def _tail(self):
+        # Only events published from now on; reconnecting clients replay with Last-Event-ID
+        last_id = ObjectId.from_datetime(datetime.utcnow())
+        while True:
+            try:
+                cursor = db.events.find({"_id": {"$gt": last_id}}, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    for event in cursor:
+                        last_id = event["_id"]
+                        self._dispatch(event)
+            except PyMongoError as e:
+                print(f"[{datetime.now()}] Event tailing interrupted: {e}")
+            # A tailable cursor dies on an empty collection; try again shortly
+            time.sleep(1.0)
+
+
+broker = EventBroker()
+
+
+def _apply_availability_change(event: Dict):
+    from backend import availability
+
+    if event.get("berth_id") is None:
+        availability.invalidate(event["port_name"])
+    else:
+        availability.mark(event["port_name"], event["berth_id"],
+                          date.fromisoformat(event["start_date"]), date.fromisoformat(event["end_date"]),
+                          free=event["available"])
+
+
+def _apply_tariffs_published(event: Dict):
+    from backend import tariff_cache
+
+    tariff_cache.invalidate()
+
+
+# Changes made by other workers or replicas are applied to this worker's caches
+broker.on(AVAILABILITY_CHANGED, _apply_availability_change)
+broker.on(TARIFFS_PUBLISHED, _apply_tariffs_published)
+
+
+def start():
+    """
+    Start tailing events in this worker (idempotent).
+    """
+    broker.start()
+
+
+def replay(after_id: str, limit: int = EVENTS_QUEUE_SIZE) -> List[Dict]:
+    """
+    Events published after `after_id` that are still in the capped collection.
+    """
+    try:
+        after = ObjectId(after_id)
+    except Exception:
+        return []
+    return list(db.events.find({"_id": {"$gt": after}}).sort("_id", 1).limit(limit))
+
+
+def _matches(event: Dict, types: Optional[List[str]], port_name: Optional[str]) -> bool:
+    if types and event["type"] not in types:
+        return False
+    return port_name is None or event.get("port_name") in (None, port_name)
+
+
+async def stream(request, types: Optional[List[str]] = None, port_name: Optional[str] = None,
+                 last_event_id: Optional[str] = None):
+    """
+    SSE body: replayed events after Last-Event-ID, then live events,
+    with a keep-alive comment every EVENTS_HEARTBEAT seconds.
+    """
+    queue = broker.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        last_seen = None
+        if last_event_id:
+            loop = asyncio.get_running_loop()
+            for event in await loop.run_in_executor(None, replay, last_event_id):
+                last_seen = event["_id"]
+                if _matches(event, types, port_name):
+                    yield to_sse(event)
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if last_seen is not None and event["_id"] <= last_seen:
+                continue  # already replayed
+            if _matches(event, types, port_name):
+                yield to_sse(event)
+    finally:
+        broker.unsubscribe(queue)
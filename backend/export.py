@@ -0,0 +1,207 @@
+# backend/export.py
+"""
+Columnar export of the operational collections for analytics.
+
+Each collection is streamed from its Mongo cursor in chunks and written
+as a hive-partitioned dataset (port_name=.../day=...) under EXPORT_DIR:
+
+    EXPORT_DIR/<format>/<collection>/port_name=Puerto%20Marbella/day=2024-06-01/part-0.parquet
+
+- "parquet": zstd-compressed Parquet, the default for analytical scans.
+- "arrow":   uncompressed Arrow IPC files, which can be memory-mapped
+             and read zero-copy.
+
+Usage:
+    python -m backend.export [--format parquet|arrow] [collection ...]
+"""
+import argparse
+import os
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from backend.database import db
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "50000"))
+
+FORMATS = ("parquet", "arrow")
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("port_name", pa.string()), ("day", pa.string())]),
+    flavor="hive"
+)
+
+# Every field the scrapers may emit. Rows that lack a field get a null.
+PRICING_SCHEMA = pa.schema([
+    ("port_name", pa.string()),
+    ("day", pa.string()),
+    ("table_name", pa.string()),
+    ("boat_length_min", pa.float64()),
+    ("boat_length_max", pa.float64()),
+    ("manga", pa.float64()),
+    ("price_low_season", pa.float64()),
+    ("price_high_season", pa.float64()),
+    ("price_without_iva", pa.float64()),
+    ("price_total_iva", pa.float64()),
+    ("price_monthly_without_iva", pa.float64()),
+    ("price_annual_without_iva", pa.float64()),
+    ("price_annual_total", pa.float64()),
+    ("price_extracted", pa.float64()),
+    ("electricity_cost", pa.float64()),
+    ("water_cost", pa.float64()),
+    ("t0_cost", pa.float64()),
+    ("agua_luz", pa.float64()),
+    ("descuento", pa.string()),
+    ("season", pa.string()),
+    ("unit", pa.string()),
+    ("description_left", pa.string()),
+    ("description_mid", pa.string()),
+    ("tipo_eslora", pa.string()),
+    ("iva_included", pa.bool_()),
+    ("electricity_included", pa.bool_()),
+    ("water_included", pa.bool_()),
+    ("timestamp", pa.timestamp("us")),
+])
+
+PRICING_HISTORY_SCHEMA = PRICING_SCHEMA.append(pa.field("archived_at", pa.timestamp("us")))
+
+OCCUPANCY_SCHEMA = pa.schema([
+    ("port_name", pa.string()),
+    ("day", pa.string()),
+    ("date", pa.timestamp("us")),
+    ("berth_id", pa.string()),
+    ("boat_length", pa.float64()),
+    ("beam", pa.float64()),
+    ("available", pa.bool_()),
+])
+
+COLLECTIONS = {
+    "pricing": PRICING_SCHEMA,
+    "pricing_history": PRICING_HISTORY_SCHEMA,
+    "occupancy": OCCUPANCY_SCHEMA,
+}
+
+
+def _prepare(collection: str, doc: Dict) -> Dict:
+    """
+    Normalise one Mongo document for the columnar schema:
+    parse ISO timestamps and derive the 'day' partition key.
+    """
+    if collection == "occupancy":
+        doc["day"] = doc["date"].date().isoformat()
+        return doc
+
+    ts = doc.get("timestamp")
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+        doc["timestamp"] = ts
+    doc["day"] = ts.date().isoformat() if ts else "unknown"
+    return doc
+
+
+def iter_batches(collection: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[pa.RecordBatch]:
+    """
+    Stream a collection as Arrow record batches of at most `chunk_size` rows,
+    so memory use depends on the chunk size and not on the collection size.
+    """
+    schema = COLLECTIONS[collection]
+    cursor = db[collection].find({}, {"_id": 0}, batch_size=min(chunk_size, 10000))
+    chunk = []
+    for doc in cursor:
+        chunk.append(_prepare(collection, doc))
+        if len(chunk) >= chunk_size:
+            yield pa.RecordBatch.from_pylist(chunk, schema=schema)
+            chunk = []
+    if chunk:
+        yield pa.RecordBatch.from_pylist(chunk, schema=schema)
+
+
+def _file_format(fmt: str):
+    if fmt == "parquet":
+        file_format = ds.ParquetFileFormat()
+        return file_format, file_format.make_write_options(compression="zstd")
+    if fmt == "arrow":
+        file_format = ds.IpcFileFormat()
+        return file_format, file_format.make_write_options()
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def export_path(collection: str, fmt: str = "parquet", root: str = EXPORT_DIR) -> str:
+    return os.path.join(root, fmt, collection)
+
+
+def export_collection(collection: str, fmt: str = "parquet", root: str = EXPORT_DIR,
+                      chunk_size: int = EXPORT_CHUNK_SIZE) -> Dict:
+    """
+    Export one collection, replacing any previous export of the same partitions.
+    Returns a small summary with the row count and output path.
+    """
+    schema = COLLECTIONS[collection]
+    file_format, write_options = _file_format(fmt)
+    base_dir = export_path(collection, fmt, root)
+
+    rows = 0
+
+    def counted():
+        nonlocal rows
+        for batch in iter_batches(collection, chunk_size):
+            rows += batch.num_rows
+            yield batch
+
+    ds.write_dataset(
+        counted(),
+        base_dir,
+        schema=schema,
+        format=file_format,
+        file_options=write_options,
+        partitioning=PARTITIONING,
+        basename_template="part-{i}." + ("parquet" if fmt == "parquet" else "arrow"),
+        existing_data_behavior="delete_matching",
+        max_rows_per_group=chunk_size
+    )
+    print(f"[EXPORT] {collection} => {rows} rows in {base_dir}")
+    return {"collection": collection, "format": fmt, "rows": rows, "path": base_dir}
+
+
+def export_all(collections: Optional[List[str]] = None, fmt: str = "parquet",
+               root: str = EXPORT_DIR) -> List[Dict]:
+    return [export_collection(name, fmt, root) for name in (collections or list(COLLECTIONS))]
+
+
+def open_export(collection: str, fmt: str = "parquet", root: str = EXPORT_DIR) -> ds.Dataset:
+    """
+    Open an exported collection as a pyarrow Dataset.
+    Files are opened through a memory-mapping filesystem: Arrow IPC exports
+    are read zero-copy and Parquet pages are decoded straight from the page cache.
+    Partition keys (port_name, day) can be used in filters to prune files, e.g.:
+
+        open_export("occupancy").to_table(filter=ds.field("port_name") == "Puerto Marbella")
+    """
+    return ds.dataset(
+        export_path(collection, fmt, root),
+        schema=COLLECTIONS[collection],
+        format="parquet" if fmt == "parquet" else "ipc",
+        partitioning=PARTITIONING,
+        filesystem=fs.LocalFileSystem(use_mmap=True)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export pricing and occupancy to Parquet/Arrow.")
+    parser.add_argument("collections", nargs="*", help=f"any of {', '.join(COLLECTIONS)} (default: all)")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--out", default=EXPORT_DIR)
+    args = parser.parse_args()
+    unknown = set(args.collections) - set(COLLECTIONS)
+    if unknown:
+        parser.error(f"unknown collections: {', '.join(sorted(unknown))}")
+    for summary in export_all(args.collections or None, args.format, args.out):
+        print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+# backend/ingest.py
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from backend.database import db
+from backend.models import Tariff
+from backend import events, tariff_cache
+from backend.singleflight import acquire_lease, release_lease
+
+# Rows sent to Mongo per insert while a scrape is streamed into 'pricing'
+PRICING_CHUNK_SIZE = int(os.getenv("PRICING_CHUNK_SIZE", "1000"))
+# Upper bound for one publication; a crashed publisher's lease expires after this
+PUBLISH_LEASE_TTL = timedelta(seconds=int(os.getenv("PUBLISH_LEASE_TTL", "120")))
+PUBLISH_POLL_SECONDS = 0.5
+
+
+def _as_document(item) -> Dict:
+    # Scrapers yield typed records (scraper/records.py); plain dicts are accepted too
+    return item.to_document() if hasattr(item, "to_document") else item
+
+
+def pricing_revision() -> int:
+    """
+    Revision of the raw 'pricing' rows, increased after every change to them
+    (GET /tariffs derives its ETag from it).
+    """
+    meta = db.tariff_meta.find_one({"_id": "pricing"}, {"revision": 1})
+    return meta["revision"] if meta else 0
+
+
+def bump_pricing_revision() -> int:
+    return db.tariff_meta.find_one_and_update(
+        {"_id": "pricing"},
+        {"$inc": {"revision": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )["revision"]
+
+
+def replace_pricing(items: Iterable) -> int:
+    """
+    Replace the rows in 'pricing' for every port present in `items`.
+    `items` is consumed once, in chunks of PRICING_CHUNK_SIZE, so a scrape
+    streams straight into Mongo without being held in memory.
+    The new rows are tagged with this run's scrape_id; only once all of them
+    are in, the previous rows of those ports are copied server-side into
+    'pricing_history' (stamped with 'archived_at') and removed, so older
+    tariffs remain available for analytics and exports.
+    If the scrape fails halfway, its partial rows are removed and the
+    previous rows stay untouched.
+    Ports that are not part of this scrape keep their rows.
+    """
+    scrape_id = ObjectId()
+    ports = set()
+    try:
+        return _replace_pricing(items, scrape_id, ports)
+    finally:
+        if ports:
+            # Rows were written (and possibly removed again): readers must revalidate
+            bump_pricing_revision()
+
+
+def _replace_pricing(items: Iterable, scrape_id: ObjectId, ports: set) -> int:
+    count = 0
+    chunk: List[Dict] = []
+    try:
+        for item in items:
+            doc = _as_document(item)
+            doc["scrape_id"] = scrape_id
+            ports.add(doc["port_name"])
+            chunk.append(doc)
+            if len(chunk) >= PRICING_CHUNK_SIZE:
+                db.pricing.insert_many(chunk, ordered=False)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            db.pricing.insert_many(chunk, ordered=False)
+            count += len(chunk)
+    except Exception:
+        db.pricing.delete_many({"scrape_id": scrape_id})
+        raise
+
+    if not ports:
+        return 0
+
+    previous = {"port_name": {"$in": sorted(ports)}, "scrape_id": {"$ne": scrape_id}}
+    archived_at = datetime.utcnow()
+    db.pricing.aggregate([
+        {"$match": previous},
+        {"$addFields": {"archived_at": archived_at}},
+        {"$merge": {
+            "into": "pricing_history",
+            "whenMatched": "keepExisting",
+            "whenNotMatched": "insert"
+        }}
+    ])
+    db.pricing.delete_many(previous)
+    return count
+
+
+# -----------------------------------------------------
+# Canonical tariffs
+# -----------------------------------------------------
+ELECTRICITY_TABLES = ("T4.1 Electricidad",)
+WATER_TABLES = ("T4.2 Agua",)
+ANNUAL_TABLES = ("Tarifa Anual",)
+
+
+def _is_daily_row(item: Dict) -> bool:
+    return "price_low_season" in item and "price_high_season" in item and "boat_length_max" in item
+
+
+def _daily_utility(items: Iterable[Dict]) -> Optional[float]:
+    """
+    First positive per-day price in a utility table (rows billed per Kw/h or M3 are skipped).
+    """
+    for item in items:
+        if item.get("unit") == "EUR/day" and item.get("price_extracted"):
+            return item["price_extracted"]
+    return None
+
+
+def build_canonical_tariffs(items: Iterable[Dict]) -> List[Dict]:
+    """
+    Normalise heterogeneous scraped rows into one canonical row per
+    (port, length, beam) band:
+
+    - Seasonal rows are merged: Marbella publishes high and low season as
+      separate rows with the other season's price set to 0.0.
+      A season that is missing falls back to the other one, so no band
+      is ever quoted at 0.
+    - Per-row electricity/water/T0 columns (Marbella) are kept; otherwise
+      the port-level daily rates from the utility tables (Benalmadena) apply.
+    - Monthly/annual rates come from the band's own row or, for annual,
+      from the annual table row with the same measures.
+    - boat_length_min becomes the previous band's boat_length_max, so bands
+      are contiguous and every length up to the largest band has a match.
+    """
+    bands: Dict[tuple, Dict] = {}
+    annual: Dict[tuple, Dict] = {}
+    utilities: Dict[str, Dict[str, List[Dict]]] = {}
+
+    for item in items:
+        port = item["port_name"]
+        table = item.get("table_name", "")
+        if table in ELECTRICITY_TABLES:
+            utilities.setdefault(port, {}).setdefault("electricity", []).append(item)
+        elif table in WATER_TABLES:
+            utilities.setdefault(port, {}).setdefault("water", []).append(item)
+        elif table in ANNUAL_TABLES:
+            annual[(port, item["boat_length_max"], item.get("manga") or 0.0)] = item
+        elif _is_daily_row(item):
+            key = (port, item["boat_length_max"], item.get("manga") or 0.0)
+            band = bands.setdefault(key, {
+                "price_low_season": 0.0,
+                "price_high_season": 0.0,
+                "electricity_daily": None,
+                "water_daily": None,
+                "electricity_included": False,
+                "water_included": False,
+                "t0_daily": 0.0,
+                "iva_included": False,
+                "source_tables": [],
+            })
+            season = item.get("season")
+            if season in (None, "low") and item["price_low_season"]:
+                band["price_low_season"] = item["price_low_season"]
+            if season in (None, "high") and item["price_high_season"]:
+                band["price_high_season"] = item["price_high_season"]
+            if item.get("electricity_cost"):
+                band["electricity_daily"] = band["electricity_daily"] or item["electricity_cost"]
+            if item.get("water_cost"):
+                band["water_daily"] = band["water_daily"] or item["water_cost"]
+            if item.get("t0_cost"):
+                band["t0_daily"] = band["t0_daily"] or item["t0_cost"]
+            band["electricity_included"] |= bool(item.get("electricity_included"))
+            band["water_included"] |= bool(item.get("water_included"))
+            band["iva_included"] |= bool(item.get("iva_included"))
+            if item.get("price_monthly_without_iva"):
+                band["monthly_price"] = item["price_monthly_without_iva"]
+            if item.get("price_annual_without_iva"):
+                band["annual_price"] = item["price_annual_without_iva"]
+            if table not in band["source_tables"]:
+                band["source_tables"].append(table)
+
+    rows = []
+    bounds: Dict[str, tuple] = {}
+    for (port, length, beam), band in sorted(bands.items()):
+        low, high = band["price_low_season"], band["price_high_season"]
+        if not low and not high:
+            continue
+        band["price_low_season"] = low or high
+        band["price_high_season"] = high or low
+
+        port_utilities = utilities.get(port, {})
+        if band["electricity_daily"] is None:
+            band["electricity_daily"] = _daily_utility(port_utilities.get("electricity", []))
+        if band["water_daily"] is None:
+            band["water_daily"] = _daily_utility(port_utilities.get("water", []))
+
+        annual_row = annual.get((port, length, beam))
+        if annual_row:
+            band["annual_price"] = annual_row.get("price_annual_without_iva") or None
+            band["annual_utilities"] = annual_row.get("agua_luz")
+
+        # Same length with a wider beam shares the lower bound of the narrower band
+        last_length, last_lower = bounds.get(port, (0.0, 0.0))
+        lower = last_lower if length == last_length else last_length
+        bounds[port] = (length, lower)
+
+        tariff = Tariff(port_name=port, boat_length_min=lower, boat_length_max=length, beam_max=beam, **band)
+        rows.append(dict(tariff))
+    return rows
+
+
+def ensure_tariff_indexes():
+    # Every read loads one version; cleanup deletes by version range
+    db.tariffs.create_index([
+        ("version", ASCENDING),
+        ("port_name", ASCENDING),
+        ("boat_length_max", ASCENDING),
+        ("beam_max", ASCENDING)
+    ])
+
+
+# Publishers in this process share the lease owner, so they also take this lock
+_publish_lock = threading.Lock()
+
+
+def publish_tariffs(rows: List[Dict]) -> int:
+    """
+    Write a new version of the canonical tariffs:
+    insert the rows under a fresh version number, point 'tariff_meta' at it,
+    and only then drop older versions, so readers never see an empty table.
+    Publishers (refresh, scheduler, backend.synthetic; any process) take
+    turns through the 'publish_tariffs' lease. The current version only ever
+    moves forward, so even a publisher whose lease expired cannot roll it back.
+    Returns the current version afterwards.
+    """
+    deadline = time.monotonic() + PUBLISH_LEASE_TTL.total_seconds()
+    with _publish_lock:
+        while not acquire_lease("publish_tariffs", PUBLISH_LEASE_TTL):
+            if time.monotonic() > deadline:
+                raise RuntimeError("Timed out waiting for another tariff publication")
+            time.sleep(PUBLISH_POLL_SECONDS)
+        try:
+            return _publish(rows)
+        finally:
+            release_lease("publish_tariffs")
+
+
+def _publish(rows: List[Dict]) -> int:
+    version = db.tariff_meta.find_one_and_update(
+        {"_id": "counter"},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )["seq"]
+
+    for row in rows:
+        row["version"] = version
+    if rows:
+        db.tariffs.insert_many(rows)
+
+    try:
+        # Only forward: a missing or older current version is replaced,
+        # a newer one makes the upsert collide on _id
+        db.tariff_meta.update_one(
+            {"_id": "current", "$or": [{"version": {"$lt": version}}, {"version": {"$exists": False}}]},
+            {"$set": {"version": version, "published_at": datetime.utcnow(), "rows": len(rows)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        current = tariff_cache.current_version()
+        db.tariffs.delete_many({"version": {"$lt": current}})
+        print(f"[{datetime.now()}] Tariffs v{version} superseded by v{current}, not published.")
+        return current
+
+    if tariff_cache.TARIFF_SNAPSHOT_DIR:
+        # Workers on this host switch as soon as the snapshot pointer moves
+        from backend.snapshot import publish_snapshot
+        publish_snapshot(tariff_cache.TariffTable.from_rows(rows, version))
+    db.tariffs.delete_many({"version": {"$lt": version}})
+    tariff_cache.invalidate()
+    events.publish(events.TARIFFS_PUBLISHED, version=version, rows=len(rows))
+    print(f"[{datetime.now()}] Published tariffs v{version} ({len(rows)} rows).")
+    return version
+
+
+def rebuild_tariffs() -> int:
+    """
+    Rebuild the canonical 'tariffs' collection from everything in 'pricing'.
+    """
+    ensure_tariff_indexes()
+    rows = build_canonical_tariffs(db.pricing.find({}, {"_id": 0}))
+    return publish_tariffs(rows)
+
+
+def ingest_scraped(items: Iterable) -> int:
+    """
+    Ingestion stage for a scrape: store the raw rows in 'pricing'
+    and publish the canonical tariffs used by the quote path.
+    """
+    replace_pricing(items)
+    return rebuild_tariffs()
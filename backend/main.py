@@ -1,131 +1,267 @@
 # backend/main.py
-from fastapi import FastAPI, HTTPException
-from typing import List
+from bson import ObjectId
+from fastapi import Body, FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import List, Optional
 
-from datetime import datetime, time
-from faker import Faker
+import hashlib
+import os
+import re
+from datetime import date, datetime
 from contextlib import asynccontextmanager
 
+from backend.auth import require_admin
+from backend.availability import earliest_windows
+from backend.compression import CompressionMiddleware
 from backend.database import db
-from backend.models import PriceQuery, PriceResponse, OccupancyQuery
-from scraper.run_scrapers import run_all_scrapers  # relative import if needed
-# from .scheduler import start_scheduler
-app = FastAPI()
-fake = Faker()
-
-
-# @app.on_event("startup")
-# def startup_event():
-#    start_scheduler()
+from backend.models import (
+    PriceQuery, PriceResponse, OccupancyQuery, ExportRequest, PlanResponse, RankQuery, PortQuote,
+    WindowQuery, WindowResponse, RefreshRequest, ProfilingSettings, ReservationRequest, Reservation,
+    NearbyQuery, NearbyPort
+)
+from backend import events, occupancy_import, ports, profiling, quote_log, scrape_stats
+from backend.pricing import find_tariff, quote_stay, cheapest_plan, rank_ports
+from backend import reservations
+from backend.refresh import RefreshBusy, refresh_tariffs, start_refresh_job, get_job, list_jobs
+from backend.profiling import ProfilingMiddleware, timed
+from backend.singleflight import quotes
+from backend.ingest import pricing_revision
 
+# Replicas that only serve traffic can skip the startup scrape
+# (and never import the scraper stack) with SCRAPE_ON_STARTUP=false.
+SCRAPE_ON_STARTUP = os.getenv("SCRAPE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+# Adaptive per-port re-scraping while the server runs (backend/scheduler.py)
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "false").lower() in ("1", "true", "yes")
+# The long-stay plan is O(nights) per stay: bound one request's work (422 beyond)
+MAX_PLAN_NIGHTS = int(os.getenv("MAX_PLAN_NIGHTS", str(5 * 365)))
+MAX_PLAN_BATCH = int(os.getenv("MAX_PLAN_BATCH", "500"))
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
-    1) Each time the server starts, re-run scrapers.
+    1) Each time the server starts, re-run scrapers (unless SCRAPE_ON_STARTUP=false).
     2) Insert fresh data into MongoDB, replacing older data.
-    (Alternatively, you can use an APScheduler job for daily scraping.)
-    """
-    # SCRAPE
-    items = run_all_scrapers()
-
-    # CLEAR collection
-    db.pricing.delete_many({})  # reset
-    # INSERT
-    if items:
-        db.pricing.insert_many(items)
-
-    # Generate mock occupancy
-    db.occupancy.delete_many({})
-    mock_data = []
-    for _ in range(50):
-        random_date = fake.date_between(start_date="-1M", end_date="+1M")
-        random_datetime = datetime.combine(random_date, time(0, 0, 0))  # medianoche
-        record = {
-            "port_name": "Puerto Benalmadena" if fake.boolean(chance_of_getting_true=50) else "Puerto Marbella",
-            "date": random_datetime,
-            "boat_length": fake.random_int(min=5, max=30),
-            "available": fake.boolean(chance_of_getting_true=70)  # ~70% chance free
-        }
-        mock_data.append(record)
-    db.occupancy.insert_many(mock_data)
+    3) With SCHEDULER_ENABLED=true, keep re-checking each port at its own
+       adaptive interval (backend/scheduler.py).
+    4) Start the write-behind quote log (backend/quote_log.py) and flush it on shutdown.
+    Mock occupancy is no longer generated here: run `python -m backend.seed`.
+    """
+    # Before anything publishes: the first insert would otherwise create
+    # 'events' uncapped, and tailing it would fail
+    events.ensure_events_collection()
+    if SCRAPE_ON_STARTUP:
+        # SCRAPE, REPLACE raw rows (previous rows are archived in 'pricing_history')
+        # and publish the canonical 'tariffs' used by the quote path.
+        # Replicas starting together share one scrape (see backend/refresh.py).
+        refresh_tariffs()
+    # Tail the shared event log: keeps this worker's caches in step with
+    # changes made elsewhere and feeds GET /events
+    events.start()
+    quote_log.start()
+    scheduler = None
+    if SCHEDULER_ENABLED:
+        from backend.scheduler import start_scheduler
+        scheduler = start_scheduler()
     yield
+    if scheduler:
+        scheduler.shutdown(wait=False)
+    quote_log.stop()
 
 app = FastAPI(lifespan=lifespan)
+# gzip/brotli for large bodies (not for the SSE stream)
+app.add_middleware(CompressionMiddleware)
+# Opt-in: sampled requests (or X-Profile) get a Server-Timing header (see backend/profiling.py)
+app.add_middleware(ProfilingMiddleware)
 
-@app.post("/calculate_price", response_model=PriceResponse)
-def calculate_price(query: PriceQuery):
+
+@app.get("/health")
+def health():
     """
-    Find the appropriate pricing from the 'pricing' collection
-    and compute total cost from arrival_date to departure_date.
+    Cheap liveness/readiness probe (no database access).
     """
-    # 1) Find relevant record(s)
-    # Some websites store a single row per "range" of boat lengths
-    # We'll look for a record that includes "port_name" and range
-    # that can handle query.boat_length
-    pipeline = [
-        {"$match": {
-            "port_name": query.port_name,
-            "boat_length_min": {"$lte": query.boat_length},
-            "boat_length_max": {"$gte": query.boat_length}
-        }}
-    ]
-    docs = list(db.pricing.aggregate(pipeline))
+    return {"status": "ok"}
 
-    if not docs:
-        raise HTTPException(status_code=404, detail="No pricing found for given criteria")
 
-    doc = docs[0]  # assume only 1 relevant doc
+@app.get("/events")
+def stream_events(request: Request, types: Optional[str] = None, port_name: Optional[str] = None,
+                  last_event_id: Optional[str] = Header(default=None)):
+    """
+    Server-sent events instead of polling: 'tariffs.published' (new tariff
+    version) and 'availability.changed' (port, berth and date range).
+    Filter with ?types=a,b and ?port_name=. Browsers reconnect with
+    Last-Event-ID and get the events they missed.
+    """
+    return StreamingResponse(
+        events.stream(request, types.split(",") if types else None, port_name, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-    total_days = (query.departure_date - query.arrival_date).days
-    if total_days < 1:
-        total_days = 1  # If same-day, let's treat as 1 day
 
-    # Decide if the date is in "low" or "high" season
-    # For demonstration, let's consider:
-    #   May - Sept => high
-    #   otherwise => low
-    # More advanced logic might break it up day by day if crossing months
-    # but let's keep it simple:
+# Projected field names: plain identifiers only (no operators, no dotted paths)
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
 
-    # We'll do a naive approach: check the arrival month only
-    arrival_month = query.arrival_date.month
-    if 5 <= arrival_month <= 9:
-        daily_rate = doc["price_high_season"]
+
+def _opaque_tag(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or _opaque_tag(etag) in [_opaque_tag(tag) for tag in candidates]
+
+
+@app.get("/tariffs")
+def list_tariffs(request: Request, port_name: Optional[str] = None, table_name: Optional[str] = None,
+                 fields: Optional[str] = None):
+    """
+    Raw scraped tariff tables ('pricing'), optionally filtered by port and
+    table_name, with ?fields=a,b to return only some fields.
+    The ETag combines the revision of 'pricing' (the rows returned) with the
+    query, so a mirror re-syncing with If-None-Match gets 304 until they
+    change. It is weak: the same tag covers the br, gzip and identity bodies.
+    """
+    projection = {"_id": 0}
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        invalid = [name for name in names if not FIELD_NAME.match(name)]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid field names: {invalid}")
+        projection.update({name: 1 for name in names})
     else:
-        daily_rate = doc["price_low_season"]
+        projection["scrape_id"] = 0  # ingestion bookkeeping (backend/ingest.py)
 
-    # Add electricity / water if the user wants them and if not already included
-    additional_cost = 0.0
-    detail_info = f"Base daily rate: {daily_rate} x {total_days} days = {daily_rate * total_days}"
+    query = {}
+    if port_name:
+        query["port_name"] = port_name
+    if table_name:
+        query["table_name"] = table_name
 
-    # For simplicity, let's say each is +10 if not included
-    # In real usage, parse from doc or a separate field
-    if query.want_electricity and not doc["electricity_included"]:
-        additional_cost += 10.0
-        detail_info += " +10 for electricity"
+    revision = pricing_revision()
+    digest = hashlib.sha1(repr((port_name, table_name, sorted(projection))).encode()).hexdigest()[:16]
+    etag = f'W/"r{revision}-{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
 
-    if query.want_water and not doc["water_included"]:
-        additional_cost += 5.0
-        detail_info += " +5 for water"
+    rows = list(db.pricing.find(query, projection).sort([("port_name", 1), ("table_name", 1)]))
+    return JSONResponse(content=jsonable_encoder(rows, custom_encoder={ObjectId: str}), headers=headers)
 
-    total_cost = (daily_rate * total_days) + additional_cost
 
-    # Check IVA if needed
-    # doc["iva_included"] (boolean)
-    # If not included, we might add e.g. 21%:
-    if not doc["iva_included"]:
-        total_cost *= 1.21
-        detail_info += " (incl 21% IVA)"
+@app.post("/calculate_price", response_model=PriceResponse)
+def calculate_price(query: PriceQuery):
+    """
+    Find the canonical tariff band for the boat (see backend/tariff_cache.py)
+    and compute total cost from arrival_date to departure_date.
+    """
+    # Canonical rows are built at ingestion time (backend/ingest.py) and kept
+    # in memory per worker, so this is a single binary search.
+    # Identical concurrent queries share one computation
+    try:
+        response = quotes.do(("calculate_price", repr(query)), _price_for, query)
+    except HTTPException:
+        quote_log.record("calculate_price", query, None)
+        raise
+    # Queued only: written to 'quote_log' in batches by a background thread
+    quote_log.record("calculate_price", query, response.total_price)
+    return response
 
-    detail_info += f" = {total_cost:.2f}"
 
+def _price_for(query: PriceQuery) -> PriceResponse:
+    tariff = find_tariff(query.port_name, query.boat_length, query.beam)
+    if not tariff:
+        raise HTTPException(status_code=404, detail="No pricing found for given criteria")
+
+    with timed("pricing"):
+        total_price, detail_info = quote_stay(
+            tariff, query.arrival_date, query.departure_date,
+            query.want_electricity, query.want_water
+        )
     return PriceResponse(
-        total_price=round(total_cost, 2),
+        total_price=total_price,
         detail=detail_info
     )
 
+def _check_plan_stay(query: PriceQuery):
+    nights = (query.departure_date - query.arrival_date).days
+    if nights > MAX_PLAN_NIGHTS:
+        raise HTTPException(status_code=422,
+                            detail=f"Stays are limited to {MAX_PLAN_NIGHTS} nights (got {nights})")
+
+
+def _plan_for(query: PriceQuery, tariff) -> PlanResponse:
+    if not tariff:
+        return PlanResponse(port_name=query.port_name, detail="No pricing found for given criteria")
+    with timed("pricing"):
+        total_price, segments, detail_info = cheapest_plan(
+            tariff, query.arrival_date, query.departure_date,
+            query.want_electricity, query.want_water
+        )
+    return PlanResponse(port_name=query.port_name, total_price=total_price, plan=segments, detail=detail_info)
+
+
+@app.post("/cheapest_plan", response_model=PlanResponse)
+def calculate_cheapest_plan(query: PriceQuery):
+    """
+    Long-stay quote: the cheapest mix of daily, monthly and annual tariffs
+    covering the stay (see pricing.cheapest_plan).
+    Stays longer than MAX_PLAN_NIGHTS are rejected with 422.
+    """
+    _check_plan_stay(query)
+    tariff = find_tariff(query.port_name, query.boat_length, query.beam)
+    if not tariff:
+        quote_log.record("cheapest_plan", query, None)
+        raise HTTPException(status_code=404, detail="No pricing found for given criteria")
+    response = quotes.do(("cheapest_plan", repr(query)), _plan_for, query, tariff)
+    quote_log.record("cheapest_plan", query, response.total_price)
+    return response
+
+
+@app.post("/cheapest_plan/batch", response_model=List[PlanResponse])
+def calculate_cheapest_plan_batch(queries: List[PriceQuery] = Body(..., max_length=MAX_PLAN_BATCH)):
+    """
+    Same as /cheapest_plan for many stays at once. Each distinct
+    (port, length, beam) tariff is looked up only once; stays without a
+    matching tariff come back with total_price = null.
+    At most MAX_PLAN_BATCH stays of at most MAX_PLAN_NIGHTS nights each (422 otherwise).
+    """
+    for query in queries:
+        _check_plan_stay(query)
+    tariffs = {}
+    results = []
+    for query in queries:
+        key = (query.port_name, query.boat_length, query.beam)
+        if key not in tariffs:
+            tariffs[key] = find_tariff(query.port_name, query.boat_length, query.beam)
+        result = _plan_for(query, tariffs[key])
+        quote_log.record("cheapest_plan/batch", query, result.total_price)
+        results.append(result)
+    return results
+
+
+@app.post("/rank_ports", response_model=List[PortQuote])
+def rank_cheapest_ports(query: RankQuery):
+    """
+    Top-k cheapest ports for a boat and date range, with the full breakdown
+    per port, computed in one pass over the in-memory tariffs.
+    """
+    ranked = quotes.do(
+        ("rank_ports", repr(query)), rank_ports,
+        query.boat_length, query.arrival_date, query.departure_date,
+        query.want_electricity, query.want_water,
+        top_k=query.top_k, ports=query.ports, beam=query.beam
+    )
+    # No port was asked for: logged with the cheapest result and how many ports quoted
+    quote_log.record("rank_ports", query, ranked[0]["total_price"] if ranked else None,
+                     ports_quoted=len(ranked))
+    return ranked
+
+
 @app.post("/check_occupancy")
 def check_occupancy(query: OccupancyQuery):
     """
@@ -154,3 +290,226 @@ def check_occupancy(query: OccupancyQuery):
     # For demonstration, return them as is
     return docs
 
+
+@app.post("/earliest_window", response_model=WindowResponse)
+def earliest_window(query: WindowQuery):
+    """
+    First `nights` consecutive free nights for a boat of `boat_length`,
+    at any of the given ports, starting on or after `after`.
+    Runs a sliding-window scan over cached per-port availability arrays
+    (see backend/availability.py) instead of querying rows one by one.
+    """
+    windows = earliest_windows(
+        query.ports, query.boat_length, query.nights,
+        query.after or datetime.now().date(), query.horizon_days
+    )
+    return WindowResponse(earliest=windows[0] if windows else None, by_port=windows)
+
+
+
+@app.get("/ports")
+def list_ports():
+    """
+    Port registry: name, city and coordinates of every known marina.
+    """
+    return ports.list_ports()
+
+
+@app.post("/ports/nearby", response_model=List[NearbyPort])
+def ports_nearby(query: NearbyQuery):
+    """
+    Marinas within `radius_nm` nautical miles of a point (one $geoNear on the
+    2dsphere index), nearest first. With boat_length and dates, each port also
+    gets the stay's price and its number of free berths, so a route can be
+    planned in a single call.
+    """
+    if query.arrival_date and query.departure_date and query.departure_date < query.arrival_date:
+        raise HTTPException(status_code=400, detail="departure_date must not be before arrival_date")
+    results = ports.search_nearby(
+        query.latitude, query.longitude, query.radius_nm, query.limit,
+        query.boat_length, query.arrival_date, query.departure_date,
+        query.want_electricity, query.want_water, query.available_only, query.sort_by,
+        beam=query.beam
+    )
+    if query.boat_length is not None and query.arrival_date and query.departure_date:
+        # Like /rank_ports: no port asked for, logged with the cheapest quote
+        prices = [port["total_price"] for port in results if port.get("total_price") is not None]
+        quote_log.record("ports/nearby", query, min(prices) if prices else None, ports_quoted=len(prices))
+    return results
+
+
+@app.post("/reservations", status_code=201, response_model=Reservation)
+def create_reservation(request: ReservationRequest):
+    """
+    Book a berth for the stay: the shortest free berth that fits the boat
+    (or `berth_id`), claimed night by night in the occupancy collection.
+    Returns 409 if every candidate berth is taken.
+    """
+    if request.departure_date <= request.arrival_date:
+        raise HTTPException(status_code=400, detail="departure_date must be after arrival_date")
+    try:
+        return reservations.book(
+            request.port_name, request.boat_length, request.arrival_date, request.departure_date,
+            berth_id=request.berth_id, boat_name=request.boat_name, contact_email=request.contact_email,
+            beam=request.beam
+        )
+    except reservations.NoBerthAvailable as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/reservations", response_model=List[Reservation])
+def list_reservations(port_name: Optional[str] = None, limit: int = 50):
+    return reservations.list_reservations(port_name, limit)
+
+
+@app.get("/reservations/{reservation_id}", response_model=Reservation)
+def get_reservation(reservation_id: str):
+    reservation = reservations.get_reservation(reservation_id)
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return reservation
+
+
+@app.delete("/reservations/{reservation_id}", response_model=Reservation)
+def cancel_reservation(reservation_id: str):
+    """
+    Cancel a confirmed reservation and release its nights.
+    """
+    reservation = reservations.cancel(reservation_id)
+    if not reservation:
+        raise HTTPException(status_code=404, detail="No confirmed reservation with that id")
+    return reservation
+
+
+@app.post("/admin/export", dependencies=[Depends(require_admin)])
+def export_data(request: ExportRequest):
+    """
+    Write 'pricing', 'pricing_history' and 'occupancy' to partitioned
+    Parquet/Arrow files (see backend/export.py) and return a summary per collection.
+    """
+    from backend.export import COLLECTIONS, export_all
+
+    unknown = set(request.collections or []) - set(COLLECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown collections: {sorted(unknown)}")
+
+    return export_all(request.collections, request.format)
+
+
+@app.post("/admin/occupancy/import", dependencies=[Depends(require_admin)])
+def import_occupancy(request: Request, format: Optional[str] = None, chunk_size: int = occupancy_import.IMPORT_CHUNK_SIZE):
+    """
+    Streamed bulk import of berth-night occupancy (CSV or NDJSON body, see
+    backend/occupancy_import.py). The format comes from ?format= or the
+    Content-Type. Responds with NDJSON: one progress line per written chunk
+    (counts, conflicts with reservations, rejected lines), then a summary.
+    """
+    fmt = format or occupancy_import.detect_format(content_type=request.headers.get("content-type"))
+    if fmt not in occupancy_import.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {fmt}")
+    if not 1 <= chunk_size <= 100000:
+        raise HTTPException(status_code=400, detail="chunk_size must be between 1 and 100000")
+    return occupancy_import.ProgressResponse(
+        occupancy_import.stream(request, fmt, chunk_size),
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/admin/refresh", status_code=202, dependencies=[Depends(require_admin)])
+def enqueue_refresh(request: RefreshRequest):
+    """
+    Start an asynchronous tariff refresh for all ports or the selected ones.
+    If a refresh job already queued or running covers the requested ports,
+    that job is returned (deduplicated=true) instead of starting another
+    scrape; if it covers other ports, 409 (retry once it has finished).
+    Poll GET /admin/refresh/{job_id} for per-port progress.
+    """
+    from scraper.run_scrapers import SCRAPERS
+
+    ports = request.ports or list(SCRAPERS)
+    unknown = set(ports) - set(SCRAPERS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown ports: {sorted(unknown)}")
+
+    try:
+        job, created = start_refresh_job(ports)
+    except RefreshBusy as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job_id": e.job["job_id"]})
+    job["deduplicated"] = not created
+    return job
+
+
+@app.get("/admin/refresh", dependencies=[Depends(require_admin)])
+def list_refresh_jobs(limit: int = 20):
+    """
+    Most recent refresh jobs, newest first.
+    """
+    return list_jobs(limit)
+
+
+@app.get("/admin/refresh/{job_id}", dependencies=[Depends(require_admin)])
+def refresh_status(job_id: str):
+    """
+    Status of a refresh job: overall state plus, per port, its status,
+    duration in seconds and number of scraped rows.
+    """
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Refresh job not found")
+    return job
+
+
+@app.get("/admin/scrape_stats", dependencies=[Depends(require_admin)])
+def scrape_schedule():
+    """
+    Per-port change statistics of the adaptive scheduler: page and tariff
+    hashes, last check and change, current interval and next run.
+    """
+    return scrape_stats.list_stats()
+
+
+@app.get("/admin/demand_summary", dependencies=[Depends(require_admin)])
+def demand_summary(since: Optional[date] = None, until: Optional[date] = None,
+                   port_name: Optional[str] = None, band: float = Query(quote_log.DEMAND_LENGTH_BAND, gt=0)):
+    """
+    Quotes requested per port, boat length band and ISO week of arrival,
+    from the quote log, with how many found a tariff and the average price
+    and stay. `since`/`until` filter on when the quote was made (default: last 90 days).
+    """
+    return quote_log.demand_summary(since, until, port_name, band)
+
+
+@app.get("/admin/quote_log", dependencies=[Depends(require_admin)])
+def quote_log_status():
+    """
+    Counters of this worker's quote log: queued, written, dropped because
+    the buffer was full, and lost to failed writes.
+    """
+    return quote_log.quote_log.stats()
+
+
+@app.get("/admin/profiling", dependencies=[Depends(require_admin)])
+def profiling_status(reset: bool = False):
+    """
+    Profiling settings of this worker plus average stage timings (ms)
+    per route over the profiled requests.
+    """
+    return profiling.stats(reset)
+
+
+@app.post("/admin/profiling", dependencies=[Depends(require_admin)])
+def configure_profiling(request: ProfilingSettings):
+    """
+    Switch sampled profiling on/off and set the fraction of requests profiled.
+    Applies to the worker that receives the call.
+    """
+    return profiling.configure(request.enabled, request.sample_rate)
+
+
+@app.get("/admin/profiling/stacks", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+def profiling_stacks(reset: bool = False):
+    """
+    Stack samples taken while profiled requests were running, in folded
+    format: pipe into flamegraph.pl or load in speedscope.
+    """
+    return profiling.sampler.folded(reset)
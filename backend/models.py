@@ -1,10 +1,12 @@
 # backend/models.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date
+from typing import List, Literal, Optional
 
 class PriceQuery(BaseModel):
     port_name: str
     boat_length: float
+    beam: Optional[float] = Field(None, gt=0)  # manga; None => quote by length only
     arrival_date: date
     departure_date: date
     want_electricity: bool
@@ -18,3 +20,149 @@ class PriceResponse(BaseModel):
 class OccupancyQuery(BaseModel):
     port_name: str
     boat_length: float
+
+
+class ExportRequest(BaseModel):
+    collections: Optional[List[str]] = None  # default: all exportable collections
+    format: Literal["parquet", "arrow"] = "parquet"
+
+
+class Tariff(BaseModel):
+    """
+    Canonical tariff row ('tariffs' collection), built at ingestion time:
+    one row per port and length/beam band with everything a quote needs.
+    A band covers boats with boat_length_min < length <= boat_length_max.
+    """
+    port_name: str
+    boat_length_min: float
+    boat_length_max: float
+    beam_max: float
+    price_low_season: float   # daily, without IVA
+    price_high_season: float  # daily, without IVA
+    electricity_daily: Optional[float] = None  # None => port publishes no daily rate
+    water_daily: Optional[float] = None
+    electricity_included: bool = False
+    water_included: bool = False
+    t0_daily: float = 0.0  # T0 port tax per day (IVA exempt)
+    iva_included: bool = False
+    iva_rate: float = 0.21
+    monthly_price: Optional[float] = None  # 30 nights, without IVA
+    annual_price: Optional[float] = None  # without IVA
+    annual_utilities: Optional[float] = None
+    source_tables: List[str] = []
+    version: int = 0
+
+
+class PlanSegment(BaseModel):
+    tariff: Literal["daily", "monthly", "annual"]
+    start_date: date
+    end_date: date  # exclusive: first night not covered by this segment
+    nights: int  # nights of the stay covered by this segment
+    cost: float  # without IVA / T0
+
+
+class PlanResponse(BaseModel):
+    port_name: str
+    total_price: Optional[float] = None
+    plan: List[PlanSegment] = []
+    detail: str
+
+
+class RankQuery(BaseModel):
+    boat_length: float
+    beam: Optional[float] = Field(None, gt=0)
+    arrival_date: date
+    departure_date: date
+    want_electricity: bool = False
+    want_water: bool = False
+    top_k: int = Field(5, ge=1, le=100)
+    ports: Optional[List[str]] = None  # default: every port with tariffs
+
+
+class PortQuote(BaseModel):
+    port_name: str
+    total_price: float
+    detail: str
+
+
+class WindowQuery(BaseModel):
+    boat_length: float
+    nights: int = Field(..., ge=1, le=366)
+    after: Optional[date] = None  # default: today
+    ports: Optional[List[str]] = None  # default: every port with occupancy data
+    horizon_days: int = Field(365, ge=1, le=730)
+
+
+class WindowResult(BaseModel):
+    port_name: str
+    berth_id: str
+    berth_length: float
+    start_date: date
+    end_date: date  # departure date
+    nights: int
+
+
+class WindowResponse(BaseModel):
+    earliest: Optional[WindowResult] = None
+    by_port: List[WindowResult] = []
+
+
+class RefreshRequest(BaseModel):
+    ports: Optional[List[str]] = None  # default: every registered port
+
+
+class ProfilingSettings(BaseModel):
+    enabled: Optional[bool] = None  # None => leave unchanged
+    sample_rate: Optional[float] = Field(None, ge=0.0, le=1.0)
+
+
+class ReservationRequest(BaseModel):
+    port_name: str
+    boat_length: float
+    arrival_date: date
+    departure_date: date
+    beam: Optional[float] = Field(None, gt=0)
+    berth_id: Optional[str] = None  # default: shortest free berth that fits
+    boat_name: Optional[str] = None
+    contact_email: Optional[str] = None
+
+
+class Reservation(BaseModel):
+    reservation_id: str
+    port_name: str
+    berth_id: str
+    arrival_date: date
+    departure_date: date
+    nights: int
+    boat_length: float
+    beam: Optional[float] = None
+    boat_name: Optional[str] = None
+    contact_email: Optional[str] = None
+    status: Literal["pending", "confirmed", "cancelled"]
+
+
+class NearbyQuery(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    radius_nm: float = Field(20.0, gt=0, le=1000)  # nautical miles
+    limit: int = Field(20, ge=1, le=200)
+    # Optional stay: adds a price quote and free berth count per port
+    boat_length: Optional[float] = None
+    beam: Optional[float] = Field(None, gt=0)
+    arrival_date: Optional[date] = None
+    departure_date: Optional[date] = None
+    want_electricity: bool = False
+    want_water: bool = False
+    available_only: bool = False
+    sort_by: Literal["distance", "price"] = "distance"
+
+
+class NearbyPort(BaseModel):
+    port_name: str
+    city: Optional[str] = None
+    latitude: float
+    longitude: float
+    distance_nm: float
+    total_price: Optional[float] = None
+    detail: Optional[str] = None
+    free_berths: Optional[int] = None  # None => no berth-level occupancy data
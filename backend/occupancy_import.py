@@ -0,0 +1,409 @@
+# backend/occupancy_import.py
+"""
+Bulk import of berth-night occupancy from marina management systems.
+
+Accepts CSV (header row) or NDJSON (one JSON object per line) with:
+    port_name, berth_id, date (YYYY-MM-DD), available, boat_length[, beam]
+where boat_length/beam are the berth's maximum measures and `available`
+is true/false (also 1/0, yes/no, si/no).
+
+Rows are validated one record at a time (quoted CSV fields may span
+lines) and written in chunks of `chunk_size` unordered UpdateOne upserts
+keyed on (port_name, berth_id, date), so memory stays constant whatever
+the file size. Nights held by a
+reservation made through the API are never overwritten; they are
+reported as conflicts. One progress line is produced per chunk.
+
+Usage:
+    python -m backend.occupancy_import dump.csv
+    python -m backend.occupancy_import dump.ndjson.gz --chunk-size 10000
+    curl -T dump.csv -H 'Content-Type: text/csv' localhost:8000/admin/occupancy/import
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import gzip
+import json
+import math
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from starlette.responses import StreamingResponse
+
+from backend import availability, events
+from backend.database import db
+from backend.reservations import ensure_reservation_indexes
+
+# Upserts per bulk_write
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+# Rejected lines listed per progress line (all of them are counted)
+MAX_LISTED_REJECTS = 20
+# Batches of request body lines buffered between the event loop and the import thread
+LINE_BATCHES_BUFFERED = 16
+
+FORMATS = ("csv", "ndjson")
+REQUIRED_FIELDS = ("port_name", "berth_id", "date", "available", "boat_length")
+TRUE_VALUES = {"true", "1", "yes", "si", "sí", "y"}
+FALSE_VALUES = {"false", "0", "no", "n"}
+DUPLICATE_KEY = 11000
+
+
+def detect_format(name: Optional[str] = None, content_type: Optional[str] = None) -> str:
+    if content_type and "csv" in content_type:
+        return "csv"
+    if content_type and ("ndjson" in content_type or "jsonl" in content_type or "json" in content_type):
+        return "ndjson"
+    if name and ".csv" in name.lower():
+        return "csv"
+    return "ndjson"
+
+
+def _text(row: Dict, field: str) -> str:
+    value = row.get(field)
+    if value is None or str(value).strip() == "":
+        raise ValueError(f"missing {field}")
+    return str(value).strip()
+
+
+def _positive(row: Dict, field: str) -> float:
+    value = float(_text(row, field))
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"{field} must be a positive number")
+    return value
+
+
+def _available(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value is None or str(value).strip() == "":
+        raise ValueError("missing available")
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"invalid available value: {value!r}")
+
+
+def validate(row: Dict) -> Dict:
+    """
+    Normalised occupancy fields of one input row; ValueError if it is invalid.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("row is not an object")
+    day = date.fromisoformat(_text(row, "date")[:10])
+    doc = {
+        "port_name": _text(row, "port_name"),
+        "berth_id": _text(row, "berth_id"),
+        "date": datetime.combine(day, datetime.min.time()),
+        "available": _available(row.get("available")),
+        "boat_length": _positive(row, "boat_length"),
+    }
+    if row.get("beam") not in (None, ""):
+        doc["beam"] = _positive(row, "beam")
+    return doc
+
+
+def _upsert(doc: Dict, imported_at: datetime) -> UpdateOne:
+    # A night claimed by a reservation has reservation_id and does not match:
+    # the upsert then collides with the unique (port, berth, date) index
+    # and is reported as a conflict instead of freeing the berth.
+    key = {"port_name": doc["port_name"], "berth_id": doc["berth_id"], "date": doc["date"],
+           "reservation_id": {"$exists": False}}
+    fields = {k: v for k, v in doc.items() if k not in key}
+    fields["imported_at"] = imported_at
+    return UpdateOne(key, {"$set": fields}, upsert=True)
+
+
+def write_chunk(ops: List[UpdateOne]) -> Dict:
+    """
+    One unordered bulk_write; duplicate-key errors are counted as conflicts
+    with reservations, any other write error as a rejected row.
+    """
+    if not ops:
+        return {}  # only rejected rows since the previous chunk
+    try:
+        result = db.occupancy.bulk_write(ops, ordered=False).bulk_api_result
+        errors = []
+    except BulkWriteError as e:
+        result = e.details
+        errors = result.get("writeErrors", [])
+    conflicts = sum(1 for error in errors if error.get("code") == DUPLICATE_KEY)
+    return {
+        "upserted": result.get("nUpserted", 0),
+        "modified": result.get("nModified", 0),
+        "unchanged": result.get("nMatched", 0) - result.get("nModified", 0),
+        "conflicts": conflicts,
+        "failed": len(errors) - conflicts,
+    }
+
+
+class OccupancyImport:
+    """
+    Parser and validator of one import. chunks() turns the input lines into
+    chunks of `chunk_size` upserts; the caller writes each one (write_chunk)
+    and reports it back with progress().
+    """
+
+    def __init__(self, fmt: str, chunk_size: int = IMPORT_CHUNK_SIZE):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown import format: {fmt}")
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.imported_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.line_no = 0
+        self.chunks_written = 0
+        self.ports: Set[str] = set()
+        self.totals = {"rows": 0, "rejected": 0, "upserted": 0, "modified": 0, "unchanged": 0,
+                       "conflicts": 0, "failed": 0}
+        self._rejected = 0
+        self._rejects: List[Dict] = []
+
+    def _reject(self, error: str):
+        self._rejected += 1
+        if len(self._rejects) < MAX_LISTED_REJECTS:
+            self._rejects.append({"line": self.line_no, "error": error})
+
+    def _ndjson_rows(self, lines: Iterable[str]) -> Iterator:
+        for line in lines:
+            self.line_no += 1
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    self._reject(str(e))
+
+    def _csv_rows(self, lines: Iterable[str]) -> Iterator:
+        # One reader over the whole input: quoted fields may span lines
+        reader = csv.reader(lines)
+        header = [name.strip() for name in next(reader, [])]
+        self.line_no = reader.line_num
+        missing = set(REQUIRED_FIELDS) - set(header)
+        if missing:
+            # A bad header would reject every row: abort instead
+            raise ValueError(f"CSV header lacks {', '.join(sorted(missing))}")
+        while True:
+            try:
+                values = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                self.line_no = reader.line_num
+                self._reject(str(e))
+                continue
+            self.line_no = reader.line_num
+            if any(value.strip() for value in values):
+                yield dict(zip(header, values))
+
+    def chunks(self, lines: Iterable[str]) -> Iterator[List[UpdateOne]]:
+        """
+        Chunks of upserts for the valid rows. The last chunk may be short,
+        or empty when only rejected rows remain to be reported.
+        ValueError if the input cannot be imported at all (bad CSV header).
+        """
+        rows = self._csv_rows(lines) if self.fmt == "csv" else self._ndjson_rows(lines)
+        ops: List[UpdateOne] = []
+        for row in rows:
+            try:
+                doc = validate(row)
+            except ValueError as e:
+                self._reject(str(e))
+                continue
+            self.ports.add(doc["port_name"])
+            ops.append(_upsert(doc, self.imported_at))
+            if len(ops) >= self.chunk_size:
+                yield ops
+                ops = []
+        if ops or self._rejected:
+            yield ops
+
+    def progress(self, ops: List[UpdateOne], written: Dict) -> Dict:
+        """
+        Progress line of a written chunk (rows rejected since the previous
+        chunk included), updating the running totals.
+        """
+        self.chunks_written += 1
+        chunk = {"rows": len(ops), "rejected": self._rejected, **written}
+        for key, value in chunk.items():
+            self.totals[key] += value
+        line = {"chunk": self.chunks_written, "lines_read": self.line_no, **chunk, "rejects": self._rejects,
+                "total_rows": self.totals["rows"],
+                "rows_per_s": round(self.totals["rows"] / max(time.perf_counter() - self.started, 1e-9))}
+        self._rejected, self._rejects = 0, []
+        return line
+
+    def summary(self) -> Dict:
+        """
+        Final line. The availability of every imported port is refreshed in
+        all workers (availability.changed without berth_id).
+        """
+        for port_name in sorted(self.ports):
+            availability.invalidate(port_name)
+            events.publish(events.AVAILABILITY_CHANGED, port_name=port_name, berth_id=None)
+        return {"done": True, "lines": self.line_no, "chunks": self.chunks_written, **self.totals,
+                "ports": sorted(self.ports), "seconds": round(time.perf_counter() - self.started, 3)}
+
+
+def import_lines(lines: Iterable[str], fmt: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[Dict]:
+    """
+    Import from any iterable of text lines (line endings kept, as from a
+    file opened with newline=""), yielding one progress dict per chunk and
+    the summary last. The next chunk is parsed while the previous one is
+    being written. Both the CLI and the HTTP endpoint run this pipeline.
+    """
+    ensure_reservation_indexes()
+    job = OccupancyImport(fmt, chunk_size)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = None
+        try:
+            for ops in job.chunks(lines):
+                if pending:
+                    yield job.progress(*pending.result())
+                pending = pool.submit(lambda ops=ops: (ops, write_chunk(ops)))
+            if pending:
+                yield job.progress(*pending.result())
+                pending = None
+        finally:
+            if pending and not pending.done():
+                pending.result()
+            summary = job.summary()
+    yield summary
+
+
+async def _request_batches(request) -> Iterator[List[str]]:
+    # Incremental decode of the upload into lines (endings kept, for the CSV
+    # reader); a UTF-8 BOM (spreadsheet exports) is dropped
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        if lines:
+            yield [line + "\n" for line in lines]
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield [buffer]
+
+
+class _LineBridge:
+    """
+    Hands the request body, read on the event loop, to import_lines running
+    in a worker thread, through a bounded queue (backpressure on the upload).
+    """
+
+    def __init__(self, maxsize: int = LINE_BATCHES_BUFFERED):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            try:
+                batch = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self.closed:
+                    return  # the response was abandoned mid-upload
+                continue
+            if batch is None:
+                return
+            yield from batch
+
+    def _put(self, item):
+        # Never blocks for good: gives up once the import thread has stopped reading
+        while not self.closed:
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    async def feed(self, request):
+        loop = asyncio.get_running_loop()
+        try:
+            async for batch in _request_batches(request):
+                if self.closed:
+                    return
+                await loop.run_in_executor(None, self._put, batch)
+        finally:
+            await loop.run_in_executor(None, self._put, None)
+
+    def close(self):
+        self.closed = True
+
+
+async def stream(request, fmt: str, chunk_size: int = IMPORT_CHUNK_SIZE):
+    """
+    NDJSON body of POST /admin/occupancy/import: import_lines over the
+    upload as it arrives, one progress line per written chunk.
+    """
+    loop = asyncio.get_running_loop()
+    bridge = _LineBridge()
+    feeder = asyncio.ensure_future(bridge.feed(request))
+    progress = import_lines(bridge, fmt, chunk_size)
+    try:
+        while True:
+            try:
+                line = await loop.run_in_executor(None, next, progress, None)
+            except ValueError as e:
+                yield json.dumps({"done": False, "error": str(e)}) + "\n"
+                return
+            if line is None:
+                return
+            yield json.dumps(line) + "\n"
+    finally:
+        bridge.close()
+        feeder.cancel()
+        try:
+            await feeder
+        except asyncio.CancelledError:
+            pass
+
+
+class ProgressResponse(StreamingResponse):
+    """
+    NDJSON progress streamed while the upload is still being read.
+    StreamingResponse would also listen for a client disconnect, and that
+    listener consumes request body messages the import generator needs.
+    """
+
+    def __init__(self, content, **kwargs):
+        super().__init__(content, media_type="application/x-ndjson", **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+def _open(path: str):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, encoding="utf-8-sig", newline="")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import berth-night occupancy from CSV or NDJSON.")
+    parser.add_argument("path", help="CSV/NDJSON file (optionally .gz), or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file name (ndjson for stdin)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(name=args.path)
+    with _open(args.path) as f:
+        try:
+            for progress in import_lines(f, fmt, args.chunk_size):
+                print(json.dumps(progress), flush=True)
+        except ValueError as e:
+            parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# backend/ports.py
+from datetime import date
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, GEOSPHERE
+
+from backend import availability
+from backend.database import db
+from backend.pricing import find_tariff, quote_stay
+
+METERS_PER_NAUTICAL_MILE = 1852.0
+
+# Ports we scrape. Coordinates are the harbour mouth (WGS84).
+# Edits made in the 'ports' collection are kept: seeding only inserts missing ports.
+KNOWN_PORTS = [
+    {"port_name": "Puerto Benalmadena", "city": "Benalmádena", "latitude": 36.5967, "longitude": -4.5118},
+    {"port_name": "Puerto Marbella", "city": "Marbella", "latitude": 36.5072, "longitude": -4.8856},
+]
+
+_registry_ready = False
+
+
+def point(longitude: float, latitude: float) -> Dict:
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+
+def register_port(port_name: str, latitude: float, longitude: float, **extra):
+    """
+    Add or update a port in the registry.
+    """
+    db.ports.update_one(
+        {"port_name": port_name},
+        {"$set": {"location": point(longitude, latitude), **extra}},
+        upsert=True
+    )
+
+
+def ensure_port_registry():
+    """
+    Indexes of the 'ports' collection plus the known ports (inserted only if missing).
+    """
+    global _registry_ready
+    if not _registry_ready:
+        db.ports.create_index([("location", GEOSPHERE)])
+        db.ports.create_index("port_name", unique=True)
+        for port in KNOWN_PORTS:
+            port = dict(port)
+            location = point(port.pop("longitude"), port.pop("latitude"))
+            db.ports.update_one(
+                {"port_name": port["port_name"]},
+                {"$setOnInsert": {**port, "location": location}},
+                upsert=True
+            )
+        _registry_ready = True
+
+
+def _public(doc: Dict) -> Dict:
+    longitude, latitude = doc.pop("location")["coordinates"]
+    doc.update(latitude=latitude, longitude=longitude)
+    if "distance_m" in doc:
+        doc["distance_nm"] = round(doc.pop("distance_m") / METERS_PER_NAUTICAL_MILE, 2)
+    return doc
+
+
+def list_ports() -> List[Dict]:
+    ensure_port_registry()
+    return [_public(doc) for doc in db.ports.find({}, {"_id": 0}).sort("port_name", ASCENDING)]
+
+
+def ports_near(latitude: float, longitude: float, radius_nm: float,
+               limit: int = 50, port_names: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Ports within `radius_nm` nautical miles of the point, nearest first,
+    with their distance (great-circle, from the 2dsphere index).
+    """
+    ensure_port_registry()
+    geo_near = {
+        "near": point(longitude, latitude),
+        "distanceField": "distance_m",
+        "maxDistance": radius_nm * METERS_PER_NAUTICAL_MILE,
+        "spherical": True,
+    }
+    if port_names is not None:
+        geo_near["query"] = {"port_name": {"$in": port_names}}
+    pipeline = [{"$geoNear": geo_near}, {"$limit": limit}, {"$project": {"_id": 0}}]
+    return [_public(doc) for doc in db.ports.aggregate(pipeline)]
+
+
+def search_nearby(latitude: float, longitude: float, radius_nm: float, limit: int = 20,
+                  boat_length: Optional[float] = None, arrival: Optional[date] = None,
+                  departure: Optional[date] = None, want_electricity: bool = False,
+                  want_water: bool = False, available_only: bool = False,
+                  sort_by: str = "distance", beam: Optional[float] = None) -> List[Dict]:
+    """
+    Ports near the point, each with the stay's quote (in-memory tariffs) and
+    the number of berths free for every night (cached availability), when
+    the boat and dates are given. Ports without a fitting tariff band keep
+    total_price = None and sort last by price.
+    """
+    results = ports_near(latitude, longitude, radius_nm, limit)
+    if boat_length is None or arrival is None or departure is None:
+        return results
+
+    for port in results:
+        tariff = find_tariff(port["port_name"], boat_length, beam)
+        if tariff:
+            port["total_price"], port["detail"] = quote_stay(
+                tariff, arrival, departure, want_electricity, want_water)
+        port_availability = availability.get_port_availability(port["port_name"], arrival, departure)
+        if port_availability.berth_ids:
+            port["free_berths"] = len(port_availability.free_berths(boat_length, arrival, departure, beam))
+
+    if available_only:
+        results = [port for port in results if port.get("free_berths")]
+    if sort_by == "price":
+        results.sort(key=lambda port: (port.get("total_price") is None, port.get("total_price") or 0.0))
+    return results
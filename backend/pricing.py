@@ -0,0 +1,211 @@
+# backend/pricing.py
+import heapq
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from backend.profiling import timed
+from backend.tariff_cache import get_tariffs
+
+# Flat surcharges used when a port publishes no daily utility rate
+DEFAULT_ELECTRICITY_FLAT = 10.0
+DEFAULT_WATER_FLAT = 5.0
+
+HIGH_SEASON_MONTHS = range(5, 10)  # May - Sept
+
+
+def find_tariff(port_name: str, boat_length: float, beam: Optional[float] = None) -> Optional[Dict]:
+    """
+    The smallest canonical band that fits the boat's length (and beam, when
+    given), from this worker's in-memory copy of the 'tariffs' collection.
+    Boats that no band fits get the closest band with an oversize
+    surcharge (see TariffTable.oversize).
+    """
+    with timed("lookup"):
+        return get_tariffs().find(port_name, boat_length, beam)
+
+
+def _oversize_note(tariff: Dict) -> str:
+    ratio = tariff.get("oversize_ratio")
+    return f"Oversize x{ratio:.2f} of the closest band. " if ratio and ratio > 1 else ""
+
+
+def stay_nights(arrival: date, departure: date) -> int:
+    total_days = (departure - arrival).days
+    if total_days < 1:
+        total_days = 1  # If same-day, let's treat as 1 day
+    return total_days
+
+
+def daily_rate(tariff: Dict, day: date) -> float:
+    if day.month in HIGH_SEASON_MONTHS:
+        return tariff["price_high_season"]
+    return tariff["price_low_season"]
+
+
+def quote_stay(tariff: Dict, arrival: date, departure: date,
+               want_electricity: bool, want_water: bool) -> Tuple[float, str]:
+    """
+    Price a stay with a canonical tariff row. Returns (total, detail).
+    The season is decided by the arrival month (May - Sept => high).
+    """
+    total_days = stay_nights(arrival, departure)
+    rate = daily_rate(tariff, arrival)
+
+    base_cost = rate * total_days
+    detail_info = _oversize_note(tariff) + f"Base daily rate: {rate:g} x {total_days} days = {base_cost:.2f}"
+
+    # Add electricity / water if the user wants them and if not already included
+    additional_cost = 0.0
+    if want_electricity and not tariff["electricity_included"]:
+        if tariff["electricity_daily"] is not None:
+            cost = tariff["electricity_daily"] * total_days
+            detail_info += f" +{cost:.2f} for electricity ({tariff['electricity_daily']}/day)"
+        else:
+            cost = DEFAULT_ELECTRICITY_FLAT
+            detail_info += f" +{cost:g} for electricity"
+        additional_cost += cost
+
+    if want_water and not tariff["water_included"]:
+        if tariff["water_daily"] is not None:
+            cost = tariff["water_daily"] * total_days
+            detail_info += f" +{cost:.2f} for water ({tariff['water_daily']}/day)"
+        else:
+            cost = DEFAULT_WATER_FLAT
+            detail_info += f" +{cost:g} for water"
+        additional_cost += cost
+
+    total_cost = base_cost + additional_cost
+
+    if not tariff["iva_included"]:
+        total_cost *= 1 + tariff["iva_rate"]
+        detail_info += f" (incl {tariff['iva_rate']:.0%} IVA)"
+
+    # T0 port tax is exempt from IVA
+    if tariff["t0_daily"]:
+        t0_cost = tariff["t0_daily"] * total_days
+        total_cost += t0_cost
+        detail_info += f" +{t0_cost:.2f} T0 tax"
+
+    detail_info += f" = {total_cost:.2f}"
+    return round(total_cost, 2), detail_info
+
+
+# -----------------------------------------------------
+# Cheapest plan for long stays
+# -----------------------------------------------------
+MONTH_NIGHTS = 30
+YEAR_NIGHTS = 365
+
+
+def cheapest_plan(tariff: Dict, arrival: date, departure: date,
+                  want_electricity: bool, want_water: bool) -> Tuple[float, List[Dict], str]:
+    """
+    Cheapest combination of daily, monthly (30 nights) and annual (365 nights)
+    tariffs covering every night of the stay. Returns (total, segments, detail).
+
+    Dynamic programming over the nights, O(nights):
+        best[i] = min(best[i-1]           + day(i-1),
+                      best[max(0, i-30)]  + month,
+                      best[max(0, i-365)] + year)
+    A block may extend past the departure date when that is still cheaper.
+    Unlike quote_stay, every night is priced with its own season.
+    Utilities are charged per night (annual blocks use the annual "agua + luz"
+    rate when published); IVA and the T0 tax apply to the whole plan.
+    """
+    nights = stay_nights(arrival, departure)
+
+    utilities_daily = 0.0
+    flat_cost = 0.0
+    for wanted, included, daily, flat in (
+        (want_electricity, tariff["electricity_included"], tariff["electricity_daily"], DEFAULT_ELECTRICITY_FLAT),
+        (want_water, tariff["water_included"], tariff["water_daily"], DEFAULT_WATER_FLAT),
+    ):
+        if wanted and not included:
+            if daily is not None:
+                utilities_daily += daily
+            else:
+                flat_cost += flat
+
+    options = [("daily", 1, None)]
+    if tariff.get("monthly_price"):
+        options.append(("monthly", MONTH_NIGHTS, tariff["monthly_price"] + MONTH_NIGHTS * utilities_daily))
+    if tariff.get("annual_price"):
+        annual_utilities = YEAR_NIGHTS * utilities_daily
+        if utilities_daily and tariff.get("annual_utilities"):
+            annual_utilities = tariff["annual_utilities"]
+        options.append(("annual", YEAR_NIGHTS, tariff["annual_price"] + annual_utilities))
+
+    low = tariff["price_low_season"] + utilities_daily
+    high = tariff["price_high_season"] + utilities_daily
+    night_cost = [
+        high if (arrival + timedelta(days=i)).month in HIGH_SEASON_MONTHS else low
+        for i in range(nights)
+    ]
+
+    best = [0.0] * (nights + 1)
+    choice = [0] * (nights + 1)  # index into options of the block ending at night i
+    for i in range(1, nights + 1):
+        best[i] = best[i - 1] + night_cost[i - 1]
+        for k in range(1, len(options)):
+            _, length, cost = options[k]
+            candidate = best[max(0, i - length)] + cost
+            if candidate < best[i]:
+                best[i] = candidate
+                choice[i] = k
+
+    # Walk back through the choices, merging consecutive daily nights
+    segments: List[Dict] = []
+    i = nights
+    while i > 0:
+        name, length, cost = options[choice[i]]
+        start = max(0, i - length)
+        if name == "daily" and segments and segments[-1]["tariff"] == "daily" and segments[-1]["_start"] == i:
+            segments[-1]["_start"] = start
+            segments[-1]["cost"] += night_cost[start]
+        else:
+            segments.append({"tariff": name, "_start": start, "_end": i,
+                             "cost": night_cost[start] if name == "daily" else cost})
+        i = start
+    segments.reverse()
+
+    for seg in segments:
+        seg["start_date"] = arrival + timedelta(days=seg.pop("_start"))
+        seg["end_date"] = arrival + timedelta(days=seg.pop("_end"))
+        seg["nights"] = (seg["end_date"] - seg["start_date"]).days
+        seg["cost"] = round(seg["cost"], 2)
+
+    total_cost = best[nights] + flat_cost
+    detail_info = _oversize_note(tariff) + " + ".join(f"{s['tariff']} {s['nights']}n = {s['cost']:.2f}" for s in segments)
+    if flat_cost:
+        detail_info += f" +{flat_cost:g} utilities"
+    if not tariff["iva_included"]:
+        total_cost *= 1 + tariff["iva_rate"]
+        detail_info += f" (incl {tariff['iva_rate']:.0%} IVA)"
+    if tariff["t0_daily"]:
+        t0_cost = tariff["t0_daily"] * nights
+        total_cost += t0_cost
+        detail_info += f" +{t0_cost:.2f} T0 tax"
+    detail_info += f" = {total_cost:.2f}"
+    return round(total_cost, 2), segments, detail_info
+
+
+def rank_ports(boat_length: float, arrival: date, departure: date,
+               want_electricity: bool, want_water: bool,
+               top_k: int = 5, ports: Optional[List[str]] = None,
+               beam: Optional[float] = None) -> List[Dict]:
+    """
+    Quote the same stay at every port (or the given subset) in one pass over
+    the in-memory tariffs and return the top_k cheapest, cheapest first.
+    Ports without a band for the boat are skipped.
+    """
+    with timed("lookup"):
+        table = get_tariffs()
+    quotes = []
+    with timed("pricing"):
+        for port_name in (ports if ports is not None else table.ports()):
+            tariff = table.find(port_name, boat_length, beam)
+            if tariff is None:
+                continue
+            total_price, detail_info = quote_stay(tariff, arrival, departure, want_electricity, want_water)
+            quotes.append({"port_name": port_name, "total_price": total_price, "detail": detail_info})
+        return heapq.nsmallest(top_k, quotes, key=lambda q: q["total_price"])
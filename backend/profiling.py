@@ -0,0 +1,302 @@
+# backend/profiling.py
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Set
+
+from pymongo import monitoring
+
+from backend.auth import ADMIN_TOKEN
+
+# Off by default. Can be switched on per worker at runtime (POST /admin/profiling)
+# or for a single request with the X-Profile header.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.01"))
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL_MS", "5")) / 1000
+PROFILING_MAX_STACKS = int(os.getenv("PROFILING_MAX_STACKS", "10000"))
+PROFILE_HEADER = b"x-profile"
+
+# Stats key for requests that matched no route (404s, scanners)
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Innermost Python frames of threads that are only waiting (idle pool
+# workers, event loop, pymongo monitors); their samples are skipped
+IDLE_FRAMES = {
+    "threading:wait",
+    "concurrent.futures.thread:_worker",
+    "selectors:select",
+    "pymongo.periodic_executor:_run",
+}
+
+settings = {"enabled": PROFILING_ENABLED, "sample_rate": PROFILING_SAMPLE_RATE}
+
+
+class _Profile:
+    """
+    Stage timings of one profiled request. Stages are exclusive: entering a
+    nested stage pauses the outer one, so the stages never overlap and the
+    rest of the request time is routing, validation and serialization.
+    Threads the request runs on (event loop, threadpool worker) are handed
+    to the sampler the first time one of them enters a stage.
+    """
+    __slots__ = ("timings", "stack", "threads")
+
+    def __init__(self):
+        self.timings: Dict[str, float] = defaultdict(float)
+        self.stack: List[list] = []
+        self.threads: Set[int] = set()
+
+    def track_thread(self):
+        ident = threading.get_ident()
+        if ident not in self.threads:
+            self.threads.add(ident)
+            sampler.watch(ident)
+
+    def enter(self, stage: str):
+        self.track_thread()
+        now = time.perf_counter()
+        if self.stack:
+            outer = self.stack[-1]
+            self.timings[outer[0]] += now - outer[1]
+        self.stack.append([stage, now])
+
+    def exit(self, stage: str):
+        if not self.stack or self.stack[-1][0] != stage:
+            return
+        now = time.perf_counter()
+        _, started = self.stack.pop()
+        self.timings[stage] += now - started
+        if self.stack:
+            self.stack[-1][1] = now
+
+
+# None outside profiled requests: that check is all a disabled hook costs.
+# Sync endpoints run in the threadpool with a copy of this context,
+# so their stages land in the same _Profile.
+_current: ContextVar[Optional[_Profile]] = ContextVar("profile", default=None)
+
+
+class _Stage:
+    __slots__ = ("profile", "stage")
+
+    def __init__(self, profile: _Profile, stage: str):
+        self.profile = profile
+        self.stage = stage
+
+    def __enter__(self):
+        self.profile.enter(self.stage)
+
+    def __exit__(self, *exc):
+        self.profile.exit(self.stage)
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def timed(stage: str):
+    """
+    `with timed("pricing"):` - adds the block's duration to the current
+    request's Server-Timing; does nothing when the request is not profiled.
+    """
+    profile = _current.get()
+    if profile is None:
+        return _NO_STAGE
+    return _Stage(profile, stage)
+
+
+class MongoTimer(monitoring.CommandListener):
+    """
+    pymongo command listener: time spent waiting for Mongo becomes the
+    'mongo' stage of the profiled request that issued the command.
+    """
+
+    def started(self, event):
+        profile = _current.get()
+        if profile is not None:
+            profile.enter("mongo")
+
+    def succeeded(self, event):
+        profile = _current.get()
+        if profile is not None:
+            profile.exit("mongo")
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+# -----------------------------------------------------
+# Stack sampler (flamegraph-ready folded stacks)
+# -----------------------------------------------------
+class StackSampler:
+    """
+    While at least one profiled request is in flight, a background thread
+    samples the stacks of the threads those requests run on every
+    PROFILING_INTERVAL seconds and counts them in folded format
+    ("a;b;c count"), which flamegraph.pl and speedscope read directly.
+    Other threads (unprofiled requests in the pool, the quote log writer,
+    pymongo monitors) are not sampled.
+    """
+
+    def __init__(self, interval: float = PROFILING_INTERVAL, max_stacks: int = PROFILING_MAX_STACKS):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.dropped = 0
+        # Thread ident -> number of in-flight profiled requests using it
+        self._threads: Counter = Counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, ident: int):
+        with self._lock:
+            self._threads[ident] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def unwatch(self, idents):
+        with self._lock:
+            self._threads.subtract(idents)
+            self._threads += Counter()  # drop idents no longer in use
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._threads:
+                    self._wake.wait()
+                watched = set(self._threads)
+            for ident, frame in sys._current_frames().items():
+                if ident in watched:
+                    self._record(frame)
+            time.sleep(self.interval)
+
+    def _record(self, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+            frame = frame.f_back
+        if names[0] in IDLE_FRAMES:
+            return
+        stack = ";".join(reversed(names))
+        with self._lock:
+            self.samples += 1
+            if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                self.stacks[stack] += 1
+            else:
+                self.dropped += 1
+
+    def folded(self, reset: bool = False) -> str:
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+            if reset:
+                self.stacks.clear()
+                self.samples = self.dropped = 0
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+sampler = StackSampler()
+
+# Aggregated stage timings per route: {path: {"requests": n, "ms": {stage: total}}}
+_stats: Dict[str, Dict] = {}
+_stats_lock = threading.Lock()
+
+
+def _record_stats(path: str, timings: Dict[str, float]):
+    with _stats_lock:
+        entry = _stats.setdefault(path, {"requests": 0, "ms": defaultdict(float)})
+        entry["requests"] += 1
+        for stage, ms in timings.items():
+            entry["ms"][stage] += ms
+
+
+def stats(reset: bool = False) -> Dict:
+    with _stats_lock:
+        routes = {
+            path: {"requests": e["requests"],
+                   "avg_ms": {stage: round(ms / e["requests"], 3) for stage, ms in e["ms"].items()}}
+            for path, e in _stats.items()
+        }
+        if reset:
+            _stats.clear()
+    return {**settings, "samples": sampler.samples, "stacks": len(sampler.stacks),
+            "dropped_stacks": sampler.dropped, "routes": routes}
+
+
+def configure(enabled: Optional[bool] = None, sample_rate: Optional[float] = None) -> Dict:
+    if enabled is not None:
+        settings["enabled"] = enabled
+    if sample_rate is not None:
+        settings["sample_rate"] = sample_rate
+    return dict(settings)
+
+
+# -----------------------------------------------------
+# ASGI middleware
+# -----------------------------------------------------
+def _wants_profile(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            # Same rule as the admin endpoints: with ADMIN_TOKEN set, the header must carry it
+            return not ADMIN_TOKEN or value.decode("latin-1") == ADMIN_TOKEN
+    return settings["enabled"] and random.random() < settings["sample_rate"]
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sample of requests (or those sending X-Profile) and adds a
+    Server-Timing header, e.g.
+        Server-Timing: mongo;dur=3.1, lookup;dur=0.02, pricing;dur=0.4, app;dur=1.2, total;dur=4.7
+    'app' is whatever no stage claimed: routing, Pydantic validation and serialization.
+    Plain ASGI (not BaseHTTPMiddleware) so unprofiled requests pay one header scan.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = _Profile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        profile.track_thread()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total = (time.perf_counter() - started) * 1000
+                timings = {stage: seconds * 1000 for stage, seconds in profile.timings.items()}
+                timings["app"] = max(total - sum(timings.values()), 0.0)
+                timings["total"] = total
+                header = ", ".join(f"{stage};dur={ms:.3f}" for stage, ms in timings.items())
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+                # Route template ("/admin/refresh/{job_id}") keeps the stats bounded;
+                # unmatched paths share one key so 404 probes cannot grow it
+                route = scope.get("route")
+                _record_stats(getattr(route, "path", UNMATCHED_ROUTE), timings)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            sampler.unwatch(profile.threads)
+            _current.reset(token)
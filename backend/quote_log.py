@@ -0,0 +1,220 @@
+# backend/quote_log.py
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from backend.database import db
+
+QUOTE_LOG_ENABLED = os.getenv("QUOTE_LOG_ENABLED", "true").lower() in ("1", "true", "yes")
+# Quotes buffered per worker; when full, new quotes are dropped (and counted)
+QUOTE_LOG_QUEUE_SIZE = int(os.getenv("QUOTE_LOG_QUEUE_SIZE", "10000"))
+# One insert_many per batch, or per interval when traffic is low
+QUOTE_LOG_BATCH_SIZE = int(os.getenv("QUOTE_LOG_BATCH_SIZE", "500"))
+QUOTE_LOG_FLUSH_SECONDS = float(os.getenv("QUOTE_LOG_FLUSH_SECONDS", "1.0"))
+# Width (metres) of the length bands in the demand summary
+DEMAND_LENGTH_BAND = float(os.getenv("DEMAND_LENGTH_BAND", "2"))
+
+QUERY_FIELDS = ("port_name", "boat_length", "beam", "arrival_date", "departure_date",
+                "want_electricity", "want_water")
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+class QuoteLog:
+    """
+    Write-behind log of the quotes served by this worker ('quote_log').
+    Request handlers only append a small tuple to a bounded in-process queue
+    (put_nowait: never blocks); a background thread turns them into
+    documents and writes them with batched insert_many calls.
+    If Mongo falls behind and the queue fills up, quotes are dropped and
+    counted instead of slowing down requests.
+    """
+
+    def __init__(self, maxsize: int = QUOTE_LOG_QUEUE_SIZE):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Updated from request threads and the writer: += on a shared dict is not atomic
+        self._counters_lock = threading.Lock()
+        self.counters = {"logged": 0, "dropped": 0, "written": 0, "failed": 0, "batches": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self._counters_lock:
+            self.counters[name] += n
+
+    def record(self, endpoint: str, query, total_price: Optional[float], **extra):
+        """
+        Hot path: one attribute read per field, a put_nowait and a counter update.
+        """
+        if not QUOTE_LOG_ENABLED:
+            return
+        event = (time.time(), endpoint, tuple(getattr(query, name, None) for name in QUERY_FIELDS),
+                 total_price, extra)
+        try:
+            self._queue.put_nowait(event)
+            self._count("logged")
+        except queue.Full:
+            self._count("dropped")
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and QUOTE_LOG_ENABLED:
+                ensure_quote_log_indexes()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="quote-log", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Flush what is buffered and stop the writer thread (server shutdown).
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+
+    @staticmethod
+    def _document(event) -> Dict:
+        ts, endpoint, values, total_price, extra = event
+        doc = {"ts": datetime.utcfromtimestamp(ts), "endpoint": endpoint,
+               **dict(zip(QUERY_FIELDS, values)), "total_price": total_price,
+               "found": total_price is not None, **extra}
+        # BSON has no date type
+        for name in ("arrival_date", "departure_date"):
+            if isinstance(doc[name], date):
+                doc[name] = _midnight(doc[name])
+        if doc["arrival_date"] and doc["departure_date"]:
+            doc["nights"] = max(1, (doc["departure_date"] - doc["arrival_date"]).days)
+        return doc
+
+    def _next_batch(self) -> List:
+        """
+        Wait up to QUOTE_LOG_FLUSH_SECONDS for the first quote, then collect
+        more until the batch is full or the interval is over.
+        """
+        try:
+            batch = [self._queue.get(timeout=QUOTE_LOG_FLUSH_SECONDS)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + QUOTE_LOG_FLUSH_SECONDS
+        while len(batch) < QUOTE_LOG_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List):
+        try:
+            db.quote_log.insert_many([self._document(event) for event in batch], ordered=False)
+            self._count("written", len(batch))
+            self._count("batches")
+        except PyMongoError as e:
+            # Analytics only: lose the batch rather than hold memory or retry forever
+            self._count("failed", len(batch))
+            print(f"[{datetime.now()}] Quote log write failed ({len(batch)} quotes): {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+        # Shutdown: write whatever is still buffered
+        while True:
+            batch = []
+            while len(batch) < QUOTE_LOG_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            self._write(batch)
+
+    def stats(self) -> Dict:
+        with self._counters_lock:
+            counters = dict(self.counters)
+        return {"enabled": QUOTE_LOG_ENABLED, "running": self._thread is not None,
+                "queued": self._queue.qsize(), "capacity": self._queue.maxsize, **counters}
+
+
+_indexes_ready = False
+
+
+def ensure_quote_log_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        db.quote_log.create_index([("ts", ASCENDING)])
+        _indexes_ready = True
+
+
+quote_log = QuoteLog()
+
+
+def start():
+    """
+    Start this worker's quote log writer (idempotent).
+    """
+    quote_log.start()
+
+
+def stop():
+    quote_log.stop()
+
+
+def record(endpoint: str, query, total_price: Optional[float], **extra):
+    quote_log.record(endpoint, query, total_price, **extra)
+
+
+def demand_summary(since: Optional[date] = None, until: Optional[date] = None,
+                   port_name: Optional[str] = None, band: float = DEMAND_LENGTH_BAND) -> List[Dict]:
+    """
+    Quotes requested per port, length band (`band` metres wide) and ISO week
+    of arrival, for quotes logged in [since, until] (default: last 90 days).
+    Quotes from /rank_ports and /ports/nearby name no port and are grouped
+    under port_name None.
+    """
+    until = until or date.today()
+    since = since or until - timedelta(days=90)
+    match = {"ts": {"$gte": _midnight(since), "$lt": _midnight(until + timedelta(days=1))},
+             "arrival_date": {"$ne": None}}
+    if port_name:
+        match["port_name"] = port_name
+    lower = {"$multiply": [{"$floor": {"$divide": ["$boat_length", band]}}, band]}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"port_name": "$port_name", "length_min": lower,
+                    "year": {"$isoWeekYear": "$arrival_date"}, "week": {"$isoWeek": "$arrival_date"}},
+            "quotes": {"$sum": 1},
+            "found": {"$sum": {"$cond": ["$found", 1, 0]}},
+            "avg_price": {"$avg": "$total_price"},
+            "avg_nights": {"$avg": "$nights"},
+            "with_electricity": {"$sum": {"$cond": ["$want_electricity", 1, 0]}},
+            "with_water": {"$sum": {"$cond": ["$want_water", 1, 0]}},
+        }},
+        {"$sort": {"_id.port_name": 1, "_id.length_min": 1, "_id.year": 1, "_id.week": 1}},
+    ]
+    rows = []
+    for doc in db.quote_log.aggregate(pipeline):
+        key = doc.pop("_id")
+        rows.append({
+            "port_name": key["port_name"],
+            "length_band": f"{key['length_min']:g}-{key['length_min'] + band:g}m",
+            "arrival_week": f"{key['year']}-W{key['week']:02d}",
+            **doc,
+            "avg_price": None if doc["avg_price"] is None else round(doc["avg_price"], 2),
+            "avg_nights": None if doc["avg_nights"] is None else round(doc["avg_nights"], 1),
+        })
+    return rows
@@ -0,0 +1,257 @@
+# backend/refresh.py
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+from backend import scrape_stats
+from backend.database import db
+from backend.ingest import rebuild_tariffs, replace_pricing
+from backend.singleflight import SingleFlight, acquire_lease, release_lease
+
+# Upper bound for one refresh; a crashed holder's lease (or job) expires after this
+REFRESH_LEASE_TTL = timedelta(seconds=int(os.getenv("REFRESH_LEASE_TTL", "900")))
+LEASE_POLL_SECONDS = 2.0
+
+_refreshes = SingleFlight()
+# Refreshes in this process share the lease owner (the scheduler tick and an
+# admin job would both get the lease), so they also take this lock
+_refresh_lock = threading.Lock()
+
+
+def _set_progress(job_id: Optional[str], port_name: str, **fields):
+    # progress is a list of {"port_name": ...} entries: port names are
+    # values, never field paths (they may contain dots)
+    if job_id is None:
+        return
+    db.refresh_jobs.update_one(
+        {"_id": job_id, "progress.port_name": port_name},
+        {"$set": {**{f"progress.$.{k}": v for k, v in fields.items()},
+                  "heartbeat_at": datetime.utcnow()}}
+    )
+
+
+def _refresh_port(port_name: str, skip_unchanged: bool) -> Optional[int]:
+    """
+    Fetch one port and, unless skip_unchanged finds the same tariffs as
+    last time, store its rows in 'pricing'. The page is parsed at most once.
+    Every successful check is recorded in 'scrape_stats' (backend/scrape_stats.py).
+    Returns the number of rows stored, or None if the port was unchanged.
+    """
+    from scraper.run_scrapers import fetch_port, parse_port
+
+    html = fetch_port(port_name)
+    page = scrape_stats.page_hash(html)
+    previous = scrape_stats.get_stats(port_name) if skip_unchanged else None
+    if previous and previous.get("content_hash"):
+        if previous.get("page_hash") == page:
+            # Same page: nothing to parse
+            scrape_stats.record_check(port_name, page, previous["content_hash"])
+            return None
+        # Different page: compare the parsed rows before writing, since markup
+        # noise alone should not republish tariffs. One port's rows are kept
+        # so a real change is stored without parsing the page again.
+        records = list(parse_port(port_name, html))
+        content = scrape_stats.content_hash(records)
+        if content == previous["content_hash"]:
+            scrape_stats.record_check(port_name, page, content)
+            return None
+        rows = replace_pricing(records)
+        scrape_stats.record_check(port_name, page, content)
+        return rows
+
+    fingerprint = scrape_stats.Fingerprint()
+    rows = replace_pricing(fingerprint.wrap(parse_port(port_name, html)))
+    scrape_stats.record_check(port_name, page, fingerprint.hexdigest())
+    return rows
+
+
+def run_refresh(ports: Optional[List[str]] = None, job_id: Optional[str] = None,
+                wait_for_lease: bool = False, skip_unchanged: bool = False) -> Optional[int]:
+    """
+    Scrape the given ports (default: all registered), replace their raw rows
+    and publish new canonical tariffs once at the end.
+    With skip_unchanged (the adaptive scheduler), ports whose tariffs did not
+    change since their last check are neither re-ingested nor republished.
+    A failing port is recorded and skipped; the others are still published.
+    Per-port status, timings and row counts go to the job document if job_id is set.
+    One refresh runs at a time per process (_refresh_lock) and across replicas
+    (the 'refresh' lease); with wait_for_lease, it waits up to REFRESH_LEASE_TTL
+    for both instead of skipping.
+    Returns the published tariff version, or None if nothing was published.
+    """
+    # Imported lazily: requests/bs4 are only needed when we actually scrape
+    from scraper.run_scrapers import SCRAPERS
+
+    ports = ports or list(SCRAPERS)
+    deadline = time.monotonic() + REFRESH_LEASE_TTL.total_seconds()
+    if not _refresh_lock.acquire(timeout=REFRESH_LEASE_TTL.total_seconds() if wait_for_lease else 0):
+        print(f"[{datetime.now()}] Refresh already running in this process, skipped.")
+        return None
+    try:
+        while not acquire_lease("refresh", REFRESH_LEASE_TTL):
+            if not wait_for_lease or time.monotonic() > deadline:
+                # Another replica is already scraping; its publication reaches
+                # this worker through the tariff version check.
+                print(f"[{datetime.now()}] Refresh already running elsewhere, skipped.")
+                return None
+            time.sleep(LEASE_POLL_SECONDS)
+        try:
+            return _refresh_ports(ports, job_id, skip_unchanged)
+        finally:
+            release_lease("refresh")
+    finally:
+        _refresh_lock.release()
+
+
+def _refresh_ports(ports: List[str], job_id: Optional[str], skip_unchanged: bool) -> Optional[int]:
+    scraped_rows = 0
+    for port_name in ports:
+        started = time.perf_counter()
+        _set_progress(job_id, port_name, status="running", started_at=datetime.utcnow())
+        try:
+            rows = _refresh_port(port_name, skip_unchanged)
+        except Exception as e:
+            print(f"[{datetime.now()}] Refresh of {port_name} failed: {e}")
+            scrape_stats.record_failure(port_name, str(e))
+            _set_progress(job_id, port_name, status="failed", error=str(e),
+                          seconds=round(time.perf_counter() - started, 3))
+            continue
+        if rows is None:
+            _set_progress(job_id, port_name, status="unchanged", rows=0,
+                          seconds=round(time.perf_counter() - started, 3))
+            continue
+        scraped_rows += rows
+        _set_progress(job_id, port_name, status="done", rows=rows,
+                      seconds=round(time.perf_counter() - started, 3))
+
+    if not scraped_rows:
+        return None
+    return rebuild_tariffs()
+
+
+def refresh_tariffs() -> Optional[int]:
+    """
+    Scrape every port and publish new canonical tariffs.
+    Concurrent calls in this process share one execution, and a Mongo lease
+    keeps other replicas from scraping at the same time.
+    Returns the published tariff version, or None if nothing was published.
+    """
+    return _refreshes.do("refresh", run_refresh)
+
+
+# -----------------------------------------------------
+# On-demand refresh jobs
+# -----------------------------------------------------
+class RefreshBusy(Exception):
+    """
+    A refresh job for other ports is already queued or running.
+    """
+
+    def __init__(self, job: Dict):
+        super().__init__(f"Refresh job {job['job_id']} is already running for {job['ports']}")
+        self.job = job
+
+
+_indexes_ready = False
+
+
+def ensure_job_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        # At most one job document carries active_key: inserting a second
+        # active job fails atomically, whichever worker receives the request
+        db.refresh_jobs.create_index("active_key", unique=True, sparse=True)
+        db.refresh_jobs.create_index([("requested_at", DESCENDING)])
+        _indexes_ready = True
+
+
+def _public(job: Dict) -> Dict:
+    job["job_id"] = job.pop("_id")
+    job.pop("active_key", None)
+    return job
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    job = db.refresh_jobs.find_one({"_id": job_id})
+    return _public(job) if job else None
+
+
+def list_jobs(limit: int = 20) -> List[Dict]:
+    return [_public(job) for job in db.refresh_jobs.find().sort("requested_at", DESCENDING).limit(limit)]
+
+
+def _expire_stale_job():
+    """
+    Release the active slot of a job whose worker stopped reporting
+    (e.g. the process was killed mid-refresh).
+    """
+    db.refresh_jobs.update_one(
+        {"active_key": "refresh", "heartbeat_at": {"$lt": datetime.utcnow() - REFRESH_LEASE_TTL}},
+        {"$set": {"status": "failed", "error": "stale job", "finished_at": datetime.utcnow()},
+         "$unset": {"active_key": ""}}
+    )
+
+
+def _run_job(job_id: str, ports: List[str]):
+    started = time.perf_counter()
+    db.refresh_jobs.update_one(
+        {"_id": job_id},
+        {"$set": {"status": "running", "started_at": datetime.utcnow(), "heartbeat_at": datetime.utcnow()}}
+    )
+    status, error, version = "done", None, None
+    try:
+        version = run_refresh(ports, job_id=job_id, wait_for_lease=True)
+    except Exception as e:
+        status, error = "failed", str(e)
+
+    job = db.refresh_jobs.find_one({"_id": job_id}, {"progress": 1}) or {}
+    if status == "done" and any(p.get("status") == "failed" for p in job.get("progress", [])):
+        status = "partial"
+    db.refresh_jobs.update_one(
+        {"_id": job_id},
+        {"$set": {"status": status, "error": error, "version": version,
+                  "finished_at": datetime.utcnow(), "seconds": round(time.perf_counter() - started, 3)},
+         "$unset": {"active_key": ""}}
+    )
+    print(f"[{datetime.now()}] Refresh job {job_id} {status} (tariffs v{version}).")
+
+
+def start_refresh_job(ports: List[str]) -> Tuple[Dict, bool]:
+    """
+    Enqueue a refresh of `ports` and run it in a background thread.
+    If a job already queued or running covers all of `ports`, it is returned
+    instead (created=False), so repeated clicks or several admins never scrape
+    the same sites twice. A running job for other ports raises RefreshBusy.
+    """
+    ensure_job_indexes()
+    _expire_stale_job()
+
+    now = datetime.utcnow()
+    job = {
+        "_id": uuid.uuid4().hex,
+        "active_key": "refresh",
+        "status": "queued",
+        "ports": ports,
+        "requested_at": now,
+        "heartbeat_at": now,
+        "progress": [{"port_name": port_name, "status": "queued"} for port_name in ports],
+    }
+    try:
+        db.refresh_jobs.insert_one(job)
+    except DuplicateKeyError:
+        active = db.refresh_jobs.find_one({"active_key": "refresh"})
+        if not active:
+            return start_refresh_job(ports)  # finished in the meantime
+        if not set(ports) <= set(active["ports"]):
+            raise RefreshBusy(_public(active))
+        return _public(active), False
+
+    threading.Thread(target=_run_job, args=(job["_id"], ports), name=f"refresh-{job['_id'][:8]}",
+                     daemon=True).start()
+    return _public(job), True
@@ -0,0 +1,172 @@
+# backend/reservations.py
+import os
+import uuid
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING
+
+from backend import availability, events
+from backend.database import db
+
+# Berths tried (shortest first) before giving up with a conflict
+RESERVATION_MAX_ATTEMPTS = int(os.getenv("RESERVATION_MAX_ATTEMPTS", "10"))
+
+
+class NoBerthAvailable(Exception):
+    pass
+
+
+class BerthTooSmall(NoBerthAvailable):
+    pass
+
+
+_indexes_ready = False
+
+
+def ensure_reservation_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        # One document per berth-night: a night can only be claimed once.
+        # Legacy mock rows have no berth_id and are left out of the constraint.
+        db.occupancy.create_index(
+            [("port_name", ASCENDING), ("berth_id", ASCENDING), ("date", ASCENDING)],
+            unique=True, partialFilterExpression={"berth_id": {"$exists": True}}
+        )
+        db.occupancy.create_index("reservation_id", sparse=True)
+        db.reservations.create_index([("port_name", ASCENDING), ("arrival_date", ASCENDING)])
+        _indexes_ready = True
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def _claim(reservation_id: str, port_name: str, berth_id: str, arrival: date, departure: date) -> bool:
+    """
+    Claim every night of [arrival, departure) on one berth for the reservation.
+    Each night flips available True -> False in a single conditional update, so
+    two bookings can never both get it. If any night was already taken, the
+    nights claimed here are released again and False is returned.
+    """
+    nights = (departure - arrival).days
+    result = db.occupancy.update_many(
+        {"port_name": port_name, "berth_id": berth_id, "available": True,
+         "date": {"$gte": _midnight(arrival), "$lt": _midnight(departure)}},
+        {"$set": {"available": False, "reservation_id": reservation_id}}
+    )
+    if result.modified_count == nights:
+        return True
+    if result.modified_count:
+        _release(reservation_id)
+    return False
+
+
+def _release(reservation_id: str):
+    db.occupancy.update_many(
+        {"reservation_id": reservation_id},
+        {"$set": {"available": True}, "$unset": {"reservation_id": ""}}
+    )
+
+
+def _publish_change(port_name: str, berth_id: str, start: date, end: date, available: bool):
+    events.publish(events.AVAILABILITY_CHANGED, port_name=port_name, berth_id=berth_id,
+                   start_date=start.isoformat(), end_date=end.isoformat(), available=available)
+
+
+def _public(doc: Dict) -> Dict:
+    doc["reservation_id"] = doc.pop("_id")
+    doc["arrival_date"] = doc["arrival_date"].date()
+    doc["departure_date"] = doc["departure_date"].date()
+    return doc
+
+
+def book(port_name: str, boat_length: float, arrival: date, departure: date,
+         berth_id: Optional[str] = None, boat_name: Optional[str] = None,
+         contact_email: Optional[str] = None, beam: Optional[float] = None) -> Dict:
+    """
+    Reserve a berth for [arrival, departure).
+    Candidates come from the cached availability matrix (shortest fitting berth
+    first); the claim itself is decided by Mongo, so a stale cache only costs
+    a retry on the next berth. No lock is shared between bookings: only
+    requests for the same berth-nights contend.
+    A requested berth_id must pass the same length/beam check.
+    Raises NoBerthAvailable when no candidate could be claimed
+    (BerthTooSmall when the requested berth cannot take the boat).
+    """
+    ensure_reservation_indexes()
+    port = availability.get_port_availability(port_name, arrival, departure)
+    if berth_id is not None:
+        if berth_id not in port.berth_ids:
+            raise NoBerthAvailable(f"Berth {berth_id} at {port_name} is not free from {arrival} to {departure}")
+        if not port.berth_fits(berth_id, boat_length, beam):
+            raise BerthTooSmall(f"Berth {berth_id} at {port_name} is too small for this boat")
+        candidates = [berth_id]
+    else:
+        candidates = port.free_berths(boat_length, arrival, departure, beam)
+
+    reservation = {
+        "_id": uuid.uuid4().hex,
+        "port_name": port_name,
+        "berth_id": None,
+        "arrival_date": _midnight(arrival),
+        "departure_date": _midnight(departure),
+        "nights": (departure - arrival).days,
+        "boat_length": boat_length,
+        "beam": beam,
+        "boat_name": boat_name,
+        "contact_email": contact_email,
+        "status": "pending",
+        "created_at": datetime.utcnow(),
+    }
+    # Recorded first, so nights claimed by a crashed request can be traced back
+    db.reservations.insert_one(reservation)
+
+    for candidate in candidates[:RESERVATION_MAX_ATTEMPTS]:
+        if _claim(reservation["_id"], port_name, candidate, arrival, departure):
+            db.reservations.update_one(
+                {"_id": reservation["_id"]},
+                {"$set": {"status": "confirmed", "berth_id": candidate}}
+            )
+            availability.mark(port_name, candidate, arrival, departure, free=False)
+            _publish_change(port_name, candidate, arrival, departure, available=False)
+            reservation.update(status="confirmed", berth_id=candidate)
+            return _public(reservation)
+        # Lost the race (or the cache was stale): the cache now knows better
+        availability.mark(port_name, candidate, arrival, departure, free=False)
+
+    db.reservations.delete_one({"_id": reservation["_id"]})
+    raise NoBerthAvailable(f"No free berth at {port_name} from {arrival} to {departure}")
+
+
+def get_reservation(reservation_id: str) -> Optional[Dict]:
+    doc = db.reservations.find_one({"_id": reservation_id}, {"created_at": 0})
+    return _public(doc) if doc else None
+
+
+def list_reservations(port_name: Optional[str] = None, limit: int = 50) -> List[Dict]:
+    query = {"status": {"$ne": "pending"}}
+    if port_name:
+        query["port_name"] = port_name
+    cursor = db.reservations.find(query, {"created_at": 0}).sort("arrival_date", ASCENDING).limit(limit)
+    return [_public(doc) for doc in cursor]
+
+
+def cancel(reservation_id: str) -> Optional[Dict]:
+    """
+    Cancel a confirmed reservation and free its nights.
+    """
+    doc = db.reservations.find_one_and_update(
+        {"_id": reservation_id, "status": "confirmed"},
+        {"$set": {"status": "cancelled", "cancelled_at": datetime.utcnow()}},
+        projection={"created_at": 0, "cancelled_at": 0}
+    )
+    if doc is None:
+        return None
+    _release(reservation_id)
+    availability.mark(doc["port_name"], doc["berth_id"],
+                      doc["arrival_date"].date(), doc["departure_date"].date(), free=True)
+    _publish_change(doc["port_name"], doc["berth_id"],
+                    doc["arrival_date"].date(), doc["departure_date"].date(), available=True)
+    doc["status"] = "cancelled"
+    return _public(doc)
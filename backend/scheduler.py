@@ -1,17 +1,36 @@
 # backend/scheduler.py
-from apscheduler.schedulers.background import BackgroundScheduler
-from scraper.run_scrapers import run_all_scrapers
-from .database import db
+import os
 from datetime import datetime
 
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from backend import scrape_stats
+from .refresh import run_refresh
+
+# How often the scheduler looks for ports whose next check is due
+SCHEDULER_TICK_MINUTES = int(os.getenv("SCHEDULER_TICK_MINUTES", "15"))
+
+
 def scheduled_job():
-    items = run_all_scrapers()
-    if items:
-        db.pricing.delete_many({})
-        db.pricing.insert_many(items)
-    print(f"[{datetime.now()}] Scraper job done.")
+    """
+    Refresh only the ports that are due (see backend/scrape_stats.py for
+    how each port's interval adapts). Unchanged ports are not re-ingested.
+    """
+    # Imported lazily: requests/bs4 are only needed when we actually scrape
+    from scraper.run_scrapers import SCRAPERS
+
+    due = scrape_stats.due_ports(list(SCRAPERS))
+    if not due:
+        return
+    version = run_refresh(due, skip_unchanged=True)
+    print(f"[{datetime.now()}] Scraper job done for {due} (tariffs v{version}).")
+
 
-def start_scheduler():
+def start_scheduler() -> BackgroundScheduler:
     scheduler = BackgroundScheduler()
-    scheduler.add_job(scheduled_job, 'cron', hour=2)  # 2 AM every day
+    # Every replica may tick: the refresh lease lets one of them scrape,
+    # and the shared next_run keeps the others from repeating it
+    scheduler.add_job(scheduled_job, 'interval', minutes=SCHEDULER_TICK_MINUTES,
+                      max_instances=1, coalesce=True)
     scheduler.start()
+    return scheduler
@@ -0,0 +1,164 @@
+# backend/scrape_stats.py
+import hashlib
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from pymongo import ASCENDING
+
+from backend.database import db
+from backend.pricing import HIGH_SEASON_MONTHS
+
+# Interval of a port we know nothing about yet (the old fixed cron ran daily)
+SCRAPE_INTERVAL_HOURS = float(os.getenv("SCRAPE_INTERVAL_HOURS", "24"))
+# Bounds of the adaptive interval
+SCRAPE_MIN_INTERVAL_HOURS = float(os.getenv("SCRAPE_MIN_INTERVAL_HOURS", "6"))
+SCRAPE_MAX_INTERVAL_HOURS = float(os.getenv("SCRAPE_MAX_INTERVAL_HOURS", str(14 * 24)))
+# Unchanged check => interval * factor; changed => interval / factor
+SCRAPE_BACKOFF_FACTOR = float(os.getenv("SCRAPE_BACKOFF_FACTOR", "1.5"))
+# Days before and after a season boundary during which ports are checked at the minimum interval
+SEASON_WINDOW_DAYS = int(os.getenv("SEASON_WINDOW_DAYS", "14"))
+# Each next check moves by up to +-this fraction of its interval
+SCRAPE_JITTER = float(os.getenv("SCRAPE_JITTER", "0.1"))
+
+# New tariffs are published for the new year and around each season change
+SEASON_BOUNDARY_MONTHS = sorted({1, HIGH_SEASON_MONTHS.start, HIGH_SEASON_MONTHS.stop % 12 or 12})
+
+_indexes_ready = False
+
+
+def ensure_stats_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        db.scrape_stats.create_index([("next_run", ASCENDING)])
+        _indexes_ready = True
+
+
+def page_hash(html: str) -> str:
+    return hashlib.sha1(html.encode("utf-8", "replace")).hexdigest()
+
+
+class Fingerprint:
+    """
+    Hash of the scraped tariff rows (without their scrape timestamp), fed
+    while the rows stream by. Unlike the page hash it ignores markup noise
+    such as rotating banners or CSRF tokens.
+    """
+
+    def __init__(self):
+        self._sha = hashlib.sha1()
+
+    def wrap(self, records: Iterable) -> Iterator:
+        for record in records:
+            self._sha.update(repr(record._replace(timestamp="")).encode())
+            yield record
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+
+def content_hash(records: Iterable) -> str:
+    fingerprint = Fingerprint()
+    for _ in fingerprint.wrap(records):
+        pass
+    return fingerprint.hexdigest()
+
+
+def season_boundaries(around: datetime) -> List[datetime]:
+    return [datetime(year, month, 1)
+            for year in (around.year - 1, around.year, around.year + 1)
+            for month in SEASON_BOUNDARY_MONTHS]
+
+
+def near_season_boundary(now: datetime) -> bool:
+    window = timedelta(days=SEASON_WINDOW_DAYS)
+    return any(abs(now - boundary) <= window for boundary in season_boundaries(now))
+
+
+def next_check(interval_hours: float, now: datetime) -> datetime:
+    """
+    When to check a port again: at the minimum interval inside a season
+    window, otherwise after `interval_hours` but never later than the start
+    of the next window; then jittered so ports do not all fire together.
+    """
+    if near_season_boundary(now):
+        hours = SCRAPE_MIN_INTERVAL_HOURS
+    else:
+        window_start = min(boundary - timedelta(days=SEASON_WINDOW_DAYS)
+                           for boundary in season_boundaries(now)
+                           if boundary - timedelta(days=SEASON_WINDOW_DAYS) > now)
+        until_window = (window_start - now).total_seconds() / 3600
+        hours = max(SCRAPE_MIN_INTERVAL_HOURS, min(interval_hours, until_window))
+    hours *= 1 + random.uniform(-SCRAPE_JITTER, SCRAPE_JITTER)
+    return now + timedelta(hours=hours)
+
+
+def get_stats(port_name: str) -> Optional[Dict]:
+    return db.scrape_stats.find_one({"_id": port_name})
+
+
+def list_stats() -> List[Dict]:
+    stats = []
+    for doc in db.scrape_stats.find().sort("_id", ASCENDING):
+        doc["port_name"] = doc.pop("_id")
+        stats.append(doc)
+    return stats
+
+
+def due_ports(ports: List[str], now: Optional[datetime] = None) -> List[str]:
+    """
+    Ports whose next check is due, plus ports that were never checked.
+    """
+    ensure_stats_indexes()
+    now = now or datetime.utcnow()
+    scheduled = {doc["_id"]: doc.get("next_run") for doc in
+                 db.scrape_stats.find({"_id": {"$in": ports}}, {"next_run": 1})}
+    return [port for port in ports if scheduled.get(port) is None or scheduled[port] <= now]
+
+
+def record_check(port_name: str, page: str, content: str) -> Dict:
+    """
+    Store the outcome of a successful check and schedule the next one.
+    A change in the tariff rows shortens the port's interval, an unchanged
+    check lengthens it (within the min/max bounds).
+    """
+    now = datetime.utcnow()
+    previous = get_stats(port_name) or {}
+    changed = previous.get("content_hash") != content
+    interval = previous.get("interval_hours", SCRAPE_INTERVAL_HOURS)
+    if previous:
+        interval = interval / SCRAPE_BACKOFF_FACTOR if changed else interval * SCRAPE_BACKOFF_FACTOR
+    interval = min(SCRAPE_MAX_INTERVAL_HOURS, max(SCRAPE_MIN_INTERVAL_HOURS, interval))
+
+    update = {
+        "page_hash": page,
+        "content_hash": content,
+        "interval_hours": round(interval, 2),
+        "last_checked": now,
+        "next_run": next_check(interval, now),
+        "failures": 0,
+    }
+    if changed:
+        update["last_changed"] = now
+    db.scrape_stats.update_one(
+        {"_id": port_name},
+        {"$set": update, "$inc": {"checks": 1, "changes": int(changed)}, "$unset": {"last_error": ""}},
+        upsert=True
+    )
+    return {**previous, **update, "changed": changed}
+
+
+def record_failure(port_name: str, error: str):
+    """
+    A failed check is retried after the minimum interval; the port's
+    interval itself is left as it was.
+    """
+    now = datetime.utcnow()
+    db.scrape_stats.update_one(
+        {"_id": port_name},
+        {"$set": {"last_error": error, "last_failed": now,
+                  "next_run": next_check(SCRAPE_MIN_INTERVAL_HOURS, now)},
+         "$inc": {"failures": 1}},
+        upsert=True
+    )
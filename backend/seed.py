@@ -0,0 +1,59 @@
+# backend/seed.py
+"""
+Seed MongoDB with mock occupancy data for local development.
+This used to run inside the backend `lifespan` on every boot.
+
+Each mock berth gets a berth_id and one row per night, so the rows can be
+booked through /reservations as well as quoted.
+
+Usage:
+    python -m backend.seed [--berths 10]
+"""
+import argparse
+from datetime import date, datetime, time, timedelta
+
+from faker import Faker
+
+from backend.database import db
+
+PORTS = {"Puerto Benalmadena": "BEN", "Puerto Marbella": "MAR"}
+# Nights before and after today covered by the mock rows
+SEED_DAYS = 30
+
+
+def seed_mock_occupancy(berths: int = 10) -> int:
+    """
+    Replace the 'occupancy' collection with `berths` random berths per port,
+    each with one row per night over the month before and after today.
+    """
+    fake = Faker()
+    db.occupancy.delete_many({})
+    today = date.today()
+    mock_data = []
+    for port_name, prefix in PORTS.items():
+        for i in range(berths):
+            berth_id = f"{prefix}-{i + 1:02d}"
+            boat_length = fake.random_int(min=5, max=30)
+            for offset in range(-SEED_DAYS, SEED_DAYS + 1):
+                mock_data.append({
+                    "port_name": port_name,
+                    "berth_id": berth_id,
+                    "date": datetime.combine(today + timedelta(days=offset), time(0, 0, 0)),  # medianoche
+                    "boat_length": boat_length,
+                    "available": fake.boolean(chance_of_getting_true=70)  # ~70% chance free
+                })
+    if mock_data:
+        db.occupancy.insert_many(mock_data)
+    return len(mock_data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed mock occupancy data.")
+    parser.add_argument("--berths", type=int, default=10, help="Mock berths per port")
+    args = parser.parse_args()
+    inserted = seed_mock_occupancy(args.berths)
+    print(f"[{datetime.now()}] Seeded {inserted} mock occupancy rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# backend/singleflight.py
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Hashable
+
+from pymongo.errors import DuplicateKeyError
+
+from backend.database import db
+from backend.profiling import timed
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+    The first caller (the leader) runs the function; callers arriving while
+    it is in flight wait and receive the same result (or exception).
+    Nothing is cached: once the call finishes, the next caller runs it again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            with timed("coalesced"):
+                call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+# Shared instance for quote computations (keyed by endpoint + query)
+quotes = SingleFlight()
+
+
+# -----------------------------------------------------
+# Cross-process leases (several replicas / workers)
+# -----------------------------------------------------
+# Default lease owner: one per process, shared by all of its threads
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_lease(name: str, ttl: timedelta, owner: str = OWNER_ID) -> bool:
+    """
+    Take the named lease in the 'locks' collection if it is free, expired,
+    or already ours. Atomic: the conditional upsert fails with a duplicate key
+    when another owner holds an unexpired lease.
+    The lease excludes other owners only. With the default owner it is
+    re-entrant for every thread of this process: a second acquire succeeds
+    (and extends the TTL), and the first release frees it for everyone.
+    Callers that can run concurrently in one process must also hold a local
+    lock (see ingest._publish_lock, refresh._refresh_lock) or pass their own
+    owner token to both acquire_lease and release_lease.
+    """
+    now = datetime.utcnow()
+    try:
+        db.locks.find_one_and_update(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "acquired_at": now, "expires_at": now + ttl}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def release_lease(name: str, owner: str = OWNER_ID):
+    db.locks.delete_one({"_id": name, "owner": owner})
@@ -0,0 +1,131 @@
+# backend/snapshot.py
+import json
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+import pyarrow as pa
+
+from backend.tariff_cache import TARIFF_SNAPSHOT_DIR, TariffTable
+
+# Snapshots kept besides the current one, for workers still mapping them
+KEEP_PREVIOUS = 1
+POINTER = "CURRENT"
+
+_pointer_stat = None
+_pointer_version: Optional[int] = None
+
+
+def snapshot_path(version: int, directory: str = TARIFF_SNAPSHOT_DIR) -> str:
+    return os.path.join(directory, f"tariffs-v{version}.arrow")
+
+
+def write_snapshot(table: TariffTable, directory: str = TARIFF_SNAPSHOT_DIR) -> str:
+    """
+    Write `table` as an Arrow IPC file (one record batch, no compression) so
+    workers can memory-map it. Booleans are stored as uint8 to keep every
+    column zero-copy. The file appears atomically and is never rewritten:
+    if another worker got there first its file is kept.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(table.version, directory)
+    if os.path.exists(path):
+        return path
+
+    arrays = []
+    names = []
+    for name, column in table.columns.items():
+        arrays.append(pa.array(column.view(np.uint8) if column.dtype == np.bool_ else column))
+        names.append(name)
+    metadata = {"version": str(table.version), "port_names": json.dumps(table.port_names)}
+    batch = pa.RecordBatch.from_arrays(arrays, names=names).replace_schema_metadata(metadata)
+
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        os.link(tmp, path)
+    except FileExistsError:
+        pass
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return path
+
+
+def read_snapshot(version: int, directory: str = TARIFF_SNAPSHOT_DIR) -> Optional[TariffTable]:
+    """
+    Map the snapshot of `version` read-only. The columns are numpy views over
+    the mapped file, so the pages are shared by every worker on the host.
+    Returns None if that snapshot does not exist (yet).
+    """
+    path = snapshot_path(version, directory)
+    try:
+        source = pa.memory_map(path, "r")
+    except FileNotFoundError:
+        return None
+    reader = pa.ipc.open_file(source)
+    metadata = {k.decode(): v.decode() for k, v in (reader.schema.metadata or {}).items()}
+    columns = {}
+    if reader.num_record_batches:
+        batch = reader.get_batch(0)
+        for name, column in zip(batch.schema.names, batch.columns):
+            array = column.to_numpy(zero_copy_only=True)
+            columns[name] = array.view(np.bool_) if name in TariffTable.BOOL_COLUMNS else array
+    else:
+        columns = TariffTable.from_rows([]).columns
+    return TariffTable(int(metadata["version"]), json.loads(metadata["port_names"]), columns)
+
+
+def point_to(version: int, directory: str = TARIFF_SNAPSHOT_DIR):
+    """
+    Make `version` the host's current snapshot (atomic rename of the pointer
+    file). The pointer only moves forward.
+    """
+    current = pointed_version(directory)
+    if current is not None and current >= version:
+        return
+    tmp = os.path.join(directory, f"{POINTER}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(str(version))
+    os.replace(tmp, os.path.join(directory, POINTER))
+    _prune(version, directory)
+
+
+def pointed_version(directory: str = TARIFF_SNAPSHOT_DIR) -> Optional[int]:
+    """
+    Version the pointer file names, re-read only when the file changed
+    (one stat() per call, cheap enough for the quote path).
+    """
+    global _pointer_stat, _pointer_version
+    try:
+        st = os.stat(os.path.join(directory, POINTER))
+    except FileNotFoundError:
+        return None
+    key = (st.st_ino, st.st_mtime_ns)
+    if key != _pointer_stat:
+        with open(os.path.join(directory, POINTER)) as f:
+            _pointer_version = int(f.read().strip())
+        _pointer_stat = key
+    return _pointer_version
+
+
+def _prune(version: int, directory: str):
+    """
+    Delete snapshots older than the previous KEEP_PREVIOUS versions.
+    Workers that still map a deleted file keep reading it until they switch.
+    """
+    for name in os.listdir(directory):
+        if name.startswith("tariffs-v") and name.endswith(".arrow"):
+            v = int(name[len("tariffs-v"):-len(".arrow")])
+            if v < version - KEEP_PREVIOUS:
+                try:
+                    os.unlink(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass  # pruned by another worker
+
+
+def publish_snapshot(table: TariffTable, directory: str = TARIFF_SNAPSHOT_DIR):
+    write_snapshot(table, directory)
+    point_to(table.version, directory)
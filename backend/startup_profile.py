@@ -0,0 +1,104 @@
+# backend/startup_profile.py
+"""
+Cold-start profile of the backend.
+
+1) Import time per module, from `python -X importtime -c "import backend.main"`.
+2) Time to first request: starts uvicorn in a subprocess and measures
+   the time until GET /health answers.
+
+Both run in fresh interpreters so nothing is already cached in sys.modules.
+The startup scrape is disabled (SCRAPE_ON_STARTUP=false) so the numbers
+reflect what a serving worker pays.
+
+Usage:
+    python -m backend.startup_profile [--top 25] [--port 8765]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["SCRAPE_ON_STARTUP"] = "false"
+    return env
+
+
+def import_times(module: str = "backend.main") -> List[Dict]:
+    """
+    Return one entry per imported module with its self and cumulative
+    import time in milliseconds, sorted by cumulative time.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=_env()
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    entries.sort(key=lambda e: e["cumulative_ms"], reverse=True)
+    return entries
+
+
+def time_to_first_request(port: int = 8765, timeout: float = 60.0) -> float:
+    """
+    Seconds from spawning `uvicorn backend.main:app` to the first 200 on /health.
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        env=_env()
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"/health did not answer within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile backend cold start.")
+    parser.add_argument("--module", default="backend.main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--skip-server", action="store_true", help="only profile imports")
+    args = parser.parse_args()
+
+    entries = import_times(args.module)
+    total = next((e["cumulative_ms"] for e in entries if e["module"] == args.module), 0.0)
+    print(f"Import of {args.module}: {total:.1f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for e in entries[:args.top]:
+        print(f"{e['cumulative_ms']:>14.1f} {e['self_ms']:>9.1f}  {e['module']}")
+
+    if not args.skip_server:
+        elapsed = time_to_first_request(args.port)
+        print(f"\nTime to first request (/health): {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
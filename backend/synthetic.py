@@ -0,0 +1,257 @@
+# backend/synthetic.py
+"""
+Synthetic dataset generator for benchmarking at production scale.
+
+Generates, for `--ports` synthetic marinas:
+  - a berth inventory ('berths': port_name, berth_id, length, beam),
+  - one occupancy row per berth and night over `--days` ('occupancy'),
+    with seasonal demand and multi-night stays,
+  - a daily tariff table per port in the same shape the scrapers
+    write to 'pricing',
+  - a position for each port along the Costa del Sol ('ports' registry).
+
+Everything is generated column-wise with NumPy from a fixed seed, so the
+same arguments always produce the same data. Documents are only built
+chunk by chunk while loading, with unordered insert_many calls.
+
+Usage:
+    python -m backend.synthetic --ports 20 --berths 300 --days 730 --seed 42
+    python -m backend.synthetic --dry-run   # generate only, no MongoDB writes
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+from backend.database import db
+from backend.ingest import bump_pricing_revision, rebuild_tariffs
+from backend.ports import register_port
+
+PORT_PREFIX = "Puerto Sintetico"
+TARIFF_TABLE = "Tarifa Sintetica"
+
+# Typical eslora mix of a Mediterranean marina (metres) and its weight
+LENGTH_CLASSES = np.array([6.0, 8.0, 10.0, 12.0, 15.0, 18.0, 20.0, 25.0, 30.0])
+LENGTH_WEIGHTS = np.array([0.12, 0.20, 0.20, 0.17, 0.12, 0.08, 0.05, 0.04, 0.02])
+
+STAY_BLOCK_NIGHTS = 4  # occupancy is drawn per block, so stays span several nights
+
+
+def port_names(n_ports: int) -> List[str]:
+    return [f"{PORT_PREFIX} {i:03d}" for i in range(1, n_ports + 1)]
+
+
+def generate_berths(rng: np.random.Generator, n_ports: int, berths_per_port: int) -> Dict[str, np.ndarray]:
+    """
+    Berth inventory as columns. Each berth has a maximum length and beam;
+    beam follows the usual ~1/3 of length with some spread (catamarans included).
+    """
+    n = n_ports * berths_per_port
+    port_idx = np.repeat(np.arange(n_ports), berths_per_port)
+    length = rng.choice(LENGTH_CLASSES, size=n, p=LENGTH_WEIGHTS / LENGTH_WEIGHTS.sum())
+    beam = np.round(length * rng.normal(0.34, 0.05, size=n).clip(0.25, 0.55), 1)
+    return {
+        "port_idx": port_idx,
+        "berth_no": np.tile(np.arange(1, berths_per_port + 1), n_ports),
+        "length": length,
+        "beam": beam,
+    }
+
+
+def seasonal_occupancy(start: date, days: int) -> np.ndarray:
+    """
+    Probability that a berth is taken on each night: ~45% in winter,
+    ~90% around early August, with a small weekend bump.
+    """
+    nights = np.datetime64(start, "D") + np.arange(days)
+    doy = (nights - nights.astype("datetime64[Y]")).astype("int64")
+    season = 0.675 + 0.225 * np.cos(2 * np.pi * (doy - 215) / 365)
+    weekday = nights.view("int64") % 7
+    weekend = np.isin(weekday, (1, 2)) * 0.05  # 1970-01-01 was a Thursday: 1=Fri, 2=Sat
+    return np.clip(season + weekend, 0.0, 0.98)
+
+
+def generate_availability(rng: np.random.Generator, n_berths: int, start: date, days: int) -> np.ndarray:
+    """
+    Boolean matrix (berths x nights), True = free.
+    Occupancy is drawn per STAY_BLOCK_NIGHTS block and expanded, so
+    free nights come in realistic runs instead of independent coin flips.
+    """
+    p_occupied = seasonal_occupancy(start, days)
+    n_blocks = -(-days // STAY_BLOCK_NIGHTS)
+    block_p = np.resize(p_occupied, n_blocks * STAY_BLOCK_NIGHTS).reshape(n_blocks, STAY_BLOCK_NIGHTS).mean(axis=1)
+    occupied = rng.random((n_berths, n_blocks)) < block_p
+    return ~np.repeat(occupied, STAY_BLOCK_NIGHTS, axis=1)[:, :days]
+
+
+def generate_tariffs(rng: np.random.Generator, n_ports: int) -> Dict[str, np.ndarray]:
+    """
+    One daily tariff row per port and length class, priced like the scraped
+    ports: roughly proportional to length^1.4, high season 30-80% dearer.
+    Monthly and annual rates are discounted multiples of the low-season day.
+    """
+    n_classes = len(LENGTH_CLASSES)
+    port_idx = np.repeat(np.arange(n_ports), n_classes)
+    length = np.tile(LENGTH_CLASSES, n_ports)
+    port_factor = rng.uniform(0.6, 1.6, size=n_ports)[port_idx]
+    low = np.round(1.2 * length ** 1.4 * port_factor, 2)
+    high = np.round(low * rng.uniform(1.3, 1.8, size=n_ports)[port_idx], 2)
+    return {
+        "port_idx": port_idx,
+        "length": length,
+        "beam": np.round(length * 0.36, 1),
+        "price_low_season": low,
+        "price_high_season": high,
+        "price_monthly": np.round(low * rng.uniform(18, 26, size=n_ports)[port_idx], 2),
+        "price_annual": np.round(low * rng.uniform(160, 240, size=n_ports)[port_idx], 2),
+    }
+
+
+# Rough coastline from Gibraltar to Almería: (longitude, latitude) waypoints
+COAST_LONGITUDES = [-5.35, -4.88, -4.42, -3.87, -3.52, -2.40]
+COAST_LATITUDES = [36.14, 36.51, 36.71, 36.75, 36.72, 36.83]
+
+
+def generate_locations(rng: np.random.Generator, n_ports: int) -> Dict[str, np.ndarray]:
+    """
+    Ports spread along the coast between Gibraltar and Almería, west to east.
+    """
+    longitude = np.sort(rng.uniform(COAST_LONGITUDES[0], COAST_LONGITUDES[-1], size=n_ports))
+    latitude = np.interp(longitude, COAST_LONGITUDES, COAST_LATITUDES) + rng.normal(0, 0.005, size=n_ports)
+    return {"latitude": np.round(latitude, 5), "longitude": np.round(longitude, 5)}
+
+
+def iter_berth_docs(names: List[str], berths: Dict[str, np.ndarray]) -> Iterator[Dict]:
+    for p, no, length, beam in zip(berths["port_idx"].tolist(), berths["berth_no"].tolist(),
+                                   berths["length"].tolist(), berths["beam"].tolist()):
+        yield {"port_name": names[p], "berth_id": f"B{no:04d}", "length": length, "beam": beam}
+
+
+def iter_occupancy_chunks(names: List[str], berths: Dict[str, np.ndarray], available: np.ndarray,
+                          start: date, chunk_size: int) -> Iterator[List[Dict]]:
+    """
+    Yield lists of occupancy documents, chunk_size berth-nights at a time,
+    slicing the generated columns instead of materialising every document.
+    """
+    n_berths, days = available.shape
+    dates = (np.datetime64(start, "D") + np.arange(days)).astype("datetime64[ms]").tolist()
+    port_of = [names[p] for p in berths["port_idx"].tolist()]
+    berth_ids = [f"B{no:04d}" for no in berths["berth_no"].tolist()]
+    lengths = berths["length"].tolist()
+    beams = berths["beam"].tolist()
+
+    flat = available.ravel()
+    total = flat.size
+    for lo in range(0, total, chunk_size):
+        hi = min(lo + chunk_size, total)
+        idx = np.arange(lo, hi)
+        b_idx = (idx // days).tolist()
+        d_idx = (idx % days).tolist()
+        yield [
+            {
+                "port_name": port_of[b],
+                "berth_id": berth_ids[b],
+                "date": dates[d],
+                "boat_length": lengths[b],
+                "beam": beams[b],
+                "available": free
+            }
+            for b, d, free in zip(b_idx, d_idx, flat[lo:hi].tolist())
+        ]
+
+
+def tariff_docs(names: List[str], tariffs: Dict[str, np.ndarray]) -> List[Dict]:
+    timestamp = datetime.utcnow().isoformat()
+    return [
+        {
+            "port_name": names[p],
+            "table_name": TARIFF_TABLE,
+            "boat_length_min": length,
+            "boat_length_max": length,
+            "manga": beam,
+            "price_high_season": high,
+            "price_low_season": low,
+            "price_monthly_without_iva": monthly,
+            "price_annual_without_iva": annual,
+            "iva_included": False,
+            "water_included": False,
+            "electricity_included": False,
+            "timestamp": timestamp
+        }
+        for p, length, beam, low, high, monthly, annual in zip(
+            tariffs["port_idx"].tolist(), tariffs["length"].tolist(), tariffs["beam"].tolist(),
+            tariffs["price_low_season"].tolist(), tariffs["price_high_season"].tolist(),
+            tariffs["price_monthly"].tolist(), tariffs["price_annual"].tolist())
+    ]
+
+
+def load_chunks(collection, chunks: Iterator[List[Dict]], workers: int = 4) -> int:
+    """
+    Insert chunks with unordered insert_many, several chunks in flight at once
+    (pymongo releases the GIL while waiting on the server).
+    """
+    inserted = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(collection.insert_many, chunk, ordered=False))
+            if len(pending) >= workers * 2:
+                inserted += len(pending.pop(0).result().inserted_ids)
+        for future in pending:
+            inserted += len(future.result().inserted_ids)
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and load a synthetic marina dataset.")
+    parser.add_argument("--ports", type=int, default=20)
+    parser.add_argument("--berths", type=int, default=300, help="berths per port")
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(date.today().year, 1, 1))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--dry-run", action="store_true", help="generate only, do not write to MongoDB")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    names = port_names(args.ports)
+
+    t0 = time.perf_counter()
+    berths = generate_berths(rng, args.ports, args.berths)
+    available = generate_availability(rng, len(berths["length"]), args.start, args.days)
+    tariffs = generate_tariffs(rng, args.ports)
+    locations = generate_locations(rng, args.ports)
+    t_gen = time.perf_counter() - t0
+    print(f"[SYNTHETIC] Generated {available.size} berth-nights for {args.ports} ports "
+          f"({available.mean():.0%} free) in {t_gen:.2f}s")
+
+    if args.dry_run:
+        return
+
+    # Remove a previous synthetic load for the same ports
+    for collection in (db.berths, db.occupancy, db.pricing):
+        collection.delete_many({"port_name": {"$in": names}})
+
+    t0 = time.perf_counter()
+    db.berths.insert_many(list(iter_berth_docs(names, berths)), ordered=False)
+    db.pricing.insert_many(tariff_docs(names, tariffs), ordered=False)
+    bump_pricing_revision()
+    inserted = load_chunks(db.occupancy, iter_occupancy_chunks(names, berths, available, args.start, args.chunk_size),
+                           args.workers)
+    t_load = time.perf_counter() - t0
+    print(f"[SYNTHETIC] Loaded {inserted} occupancy rows in {t_load:.2f}s "
+          f"({inserted / max(t_load, 1e-9):,.0f} rows/s)")
+
+    for name, latitude, longitude in zip(names, locations["latitude"].tolist(), locations["longitude"].tolist()):
+        register_port(name, latitude, longitude, city="Synthetic")
+
+    # Publish canonical tariffs including the synthetic ports
+    rebuild_tariffs()
+
+
+if __name__ == "__main__":
+    main()
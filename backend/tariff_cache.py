@@ -0,0 +1,245 @@
+# backend/tariff_cache.py
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from backend.database import db
+
+# How often (seconds) a worker checks 'tariff_meta' for a newer version
+TARIFF_CACHE_TTL = float(os.getenv("TARIFF_CACHE_TTL", "5"))
+# Directory shared by the workers of one host, e.g. /dev/shm/marine-tariffs:
+# they all map the same snapshot file (see backend/snapshot.py).
+# Empty (the default) disables snapshots; pyarrow is only imported when set.
+TARIFF_SNAPSHOT_DIR = os.getenv("TARIFF_SNAPSHOT_DIR", "")
+# A boat that no band fits is quoted at the closest band's prices times its
+# excess length x excess beam, while that stays within this fraction (0.25 => +25%)
+TARIFF_MAX_OVERSIZE = float(os.getenv("TARIFF_MAX_OVERSIZE", "0.25"))
+
+
+class TariffTable:
+    """
+    In-memory, column-oriented copy of one version of the canonical tariffs.
+    Rows are sorted by (port, boat_length_max, beam_max); each port owns a
+    contiguous slice. A length x beam lookup is a dict access, a binary
+    search on length and an O(log n) jump over rows whose beam is too small
+    (sparse table of beam maxima, see first_fitting_beam).
+    """
+
+    FLOAT_COLUMNS = (
+        "boat_length_min", "boat_length_max", "beam_max",
+        "price_low_season", "price_high_season",
+        "electricity_daily", "water_daily", "t0_daily", "iva_rate",
+        "monthly_price", "annual_price", "annual_utilities",
+    )
+    BOOL_COLUMNS = ("electricity_included", "water_included", "iva_included")
+    # Optional fields are stored as NaN and returned as None
+    OPTIONAL_COLUMNS = ("electricity_daily", "water_daily", "monthly_price", "annual_price", "annual_utilities")
+    # Prices that grow with the boat's size, scaled for oversize boats
+    SIZE_PRICED_COLUMNS = ("price_low_season", "price_high_season", "monthly_price", "annual_price", "t0_daily")
+
+    def __init__(self, version: int, port_names: List[str], columns: Dict[str, np.ndarray]):
+        self.version = version
+        self.port_names = port_names
+        self.columns = columns
+        self.ranges: Dict[str, tuple] = {}
+        port_idx = columns["port_idx"]
+        for i, name in enumerate(port_names):
+            lo = int(np.searchsorted(port_idx, i, side="left"))
+            hi = int(np.searchsorted(port_idx, i, side="right"))
+            if hi > lo:
+                self.ranges[name] = (lo, hi)
+
+        # Bands without a published beam (0 or NaN) take any beam.
+        # beam_levels[k][i] = widest beam among rows i .. i + 2**k - 1
+        beam = columns["beam_max"]
+        self.beam_levels = [np.where(beam > 0, beam, np.inf)]
+        while 2 ** len(self.beam_levels) <= len(beam):
+            prev, half = self.beam_levels[-1], 2 ** (len(self.beam_levels) - 1)
+            self.beam_levels.append(np.maximum(prev[:-half], prev[half:]))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict], version: int = 0) -> "TariffTable":
+        rows = list(rows)
+        port_names = sorted({r["port_name"] for r in rows})
+        port_of = {name: i for i, name in enumerate(port_names)}
+        rows.sort(key=lambda r: (port_of[r["port_name"]], r["boat_length_max"], r["beam_max"]))
+
+        columns = {"port_idx": np.array([port_of[r["port_name"]] for r in rows], dtype=np.int32)}
+        for name in cls.FLOAT_COLUMNS:
+            columns[name] = np.array(
+                [math.nan if r.get(name) is None else r[name] for r in rows], dtype=np.float64)
+        for name in cls.BOOL_COLUMNS:
+            columns[name] = np.array([bool(r.get(name)) for r in rows], dtype=np.bool_)
+        return cls(version, port_names, columns)
+
+    def __len__(self) -> int:
+        return len(self.columns["port_idx"])
+
+    def ports(self) -> List[str]:
+        return list(self.ranges)
+
+    def first_fitting_beam(self, i: int, hi: int, beam: float) -> Optional[int]:
+        """
+        First row in [i, hi) whose beam fits, skipping blocks of 2**k rows
+        that are all too narrow (largest block first).
+        """
+        for k in range(len(self.beam_levels) - 1, -1, -1):
+            if i + 2 ** k <= hi and self.beam_levels[k][i] < beam:
+                i += 2 ** k
+        return i if i < hi else None
+
+    def lookup(self, port_name: str, boat_length: float, beam: Optional[float] = None) -> Optional[int]:
+        """
+        Index of the smallest band of `port_name` that fits the boat: the
+        shortest boat_length_max that fits, and within it the narrowest
+        beam_max that fits. A boat too wide for its length band moves up to
+        the first longer band wide enough for it. Without a beam, the
+        narrowest band of the fitting length.
+        """
+        bounds = self.ranges.get(port_name)
+        if bounds is None:
+            return None
+        lo, hi = bounds
+        i = lo + int(np.searchsorted(self.columns["boat_length_max"][lo:hi], boat_length, side="left"))
+        if i >= hi:
+            return None
+        return self.first_fitting_beam(i, hi, beam) if beam else i
+
+    def oversize(self, port_name: str, boat_length: float, beam: Optional[float] = None) -> Optional[Dict]:
+        """
+        Quote row for a boat that no band fits. A boat too wide for every
+        band its length fits gets the widest of those bands; a boat too long
+        gets the port's largest band. Size-based prices are multiplied by the
+        excess in each dimension (boat over band, never below 1, so a short
+        boat does not offset its extra beam), up to TARIFF_MAX_OVERSIZE.
+        """
+        bounds = self.ranges.get(port_name)
+        if bounds is None:
+            return None
+        lo, hi = bounds
+        i = lo + int(np.searchsorted(self.columns["boat_length_max"][lo:hi], boat_length, side="left"))
+        if i < hi:
+            # Fits in length, so every band from i on has a beam too narrow (none is open)
+            i += int(np.argmax(self.beam_levels[0][i:hi]))
+        else:
+            i = hi - 1
+        length, band_beam = self.columns["boat_length_max"][i], self.columns["beam_max"][i]
+        ratio = max(1.0, boat_length / length)
+        if beam and band_beam > 0:
+            ratio *= max(1.0, beam / band_beam)
+        ratio = float(ratio)
+        if ratio > 1 + TARIFF_MAX_OVERSIZE:
+            return None
+        row = self.row(i)
+        for name in self.SIZE_PRICED_COLUMNS:
+            if row[name] is not None:
+                row[name] *= ratio
+        row["oversize_ratio"] = round(ratio, 4)
+        return row
+
+    def row(self, i: int) -> Dict:
+        row = {"port_name": self.port_names[self.columns["port_idx"][i]], "version": self.version}
+        for name in self.FLOAT_COLUMNS:
+            value = float(self.columns[name][i])
+            row[name] = None if name in self.OPTIONAL_COLUMNS and math.isnan(value) else value
+        for name in self.BOOL_COLUMNS:
+            row[name] = bool(self.columns[name][i])
+        return row
+
+    def find(self, port_name: str, boat_length: float, beam: Optional[float] = None) -> Optional[Dict]:
+        i = self.lookup(port_name, boat_length, beam)
+        if i is None:
+            return self.oversize(port_name, boat_length, beam)
+        return self.row(i)
+
+
+_table = TariffTable.from_rows([], version=0)
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def current_version() -> int:
+    meta = db.tariff_meta.find_one({"_id": "current"}, {"version": 1})
+    return meta["version"] if meta else 0
+
+
+def load_table(version: int) -> TariffTable:
+    if TARIFF_SNAPSHOT_DIR:
+        from backend import snapshot
+
+        table = snapshot.read_snapshot(version)
+        if table is None:
+            # Published on another host: the first worker here writes the snapshot
+            table = TariffTable.from_rows(db.tariffs.find({"version": version}, {"_id": 0}), version)
+            if not len(table):
+                return table
+            snapshot.write_snapshot(table)
+            table = snapshot.read_snapshot(version)
+        snapshot.point_to(version)
+        return table
+    return TariffTable.from_rows(db.tariffs.find({"version": version}, {"_id": 0}), version)
+
+
+def _follow_snapshot():
+    """
+    Switch to the host's current snapshot as soon as the pointer moves,
+    so all workers of the host quote from the same version.
+    """
+    global _table
+    from backend import snapshot
+
+    version = snapshot.pointed_version()
+    if version is None or version <= _table.version:
+        return
+    with _lock:
+        if version > _table.version:
+            table = snapshot.read_snapshot(version)
+            if table is not None:
+                _table = table
+                print(f"[TARIFFS] Mapped tariff snapshot v{version} ({len(_table)} rows).")
+
+
+def get_tariffs() -> TariffTable:
+    """
+    Current TariffTable of this worker. At most every TARIFF_CACHE_TTL seconds
+    one caller checks 'tariff_meta' and reloads the table if a newer version
+    was published; everyone else keeps reading the table they already have.
+    With TARIFF_SNAPSHOT_DIR set, the table is the host's mapped snapshot and
+    is swapped as soon as the snapshot pointer moves.
+    """
+    global _table, _checked_at
+    if TARIFF_SNAPSHOT_DIR:
+        _follow_snapshot()
+    if time.monotonic() - _checked_at < TARIFF_CACHE_TTL:
+        return _table
+    # Only wait for another thread's reload while nothing has been loaded yet
+    if not _lock.acquire(blocking=len(_table) == 0):
+        return _table
+    try:
+        if time.monotonic() - _checked_at < TARIFF_CACHE_TTL:
+            return _table  # reloaded by the thread we waited for
+        version = current_version()
+        if version != _table.version:
+            table = load_table(version)
+            if not len(table):
+                # Version superseded (and deleted) while we read it: retry on the next call
+                return _table
+            _table = table
+            print(f"[TARIFFS] Loaded tariffs v{version} ({len(_table)} rows).")
+        _checked_at = time.monotonic()
+    finally:
+        _lock.release()
+    return _table
+
+
+def invalidate():
+    """
+    Force the next get_tariffs() call to check for a new version
+    (used right after this process published tariffs).
+    """
+    global _checked_at
+    _checked_at = 0.0
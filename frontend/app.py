@@ -3,6 +3,22 @@ import requests
 from datetime import date, datetime, timedelta
 
 API_BASE = "http://backend:8000"
+DEFAULT_PORTS = ["Puerto Benalmadena", "Puerto Marbella"]
+
+
+@st.cache_data(ttl=300)
+def known_ports():
+    """
+    Nombres de puertos del registro del backend (GET /ports),
+    con los puertos por defecto si el backend no responde.
+    """
+    try:
+        resp = requests.get(f"{API_BASE}/ports", timeout=5)
+        if resp.status_code == 200 and resp.json():
+            return [port["port_name"] for port in resp.json()]
+    except Exception:
+        pass
+    return DEFAULT_PORTS
 
 def page_calculator():
     """
@@ -21,8 +37,10 @@ def page_calculator():
     # ----------- Price Section -----------
     st.header("Calculate Mooring Price")
 
-    port_name = st.selectbox("Select port:", ["Puerto Benalmadena", "Puerto Marbella"])
+    port_name = st.selectbox("Select port:", known_ports())
     boat_length = st.number_input("Boat length (meters):", min_value=5.0, max_value=30.0, value=8.0)
+    beam = st.number_input("Boat beam / manga (meters, 0 = unknown):", min_value=0.0, max_value=15.0, value=0.0,
+                           help="Wide boats (e.g. catamarans) may need a bigger band than their length alone")
     arrival = st.date_input("Arrival date:", value=date.today())
     departure = st.date_input("Departure date:", value=date.today())
     want_elec = st.checkbox("Do you want Electricity?", value=False)
@@ -32,6 +50,7 @@ def page_calculator():
         payload = {
             "port_name": port_name,
             "boat_length": boat_length,
+            "beam": beam or None,
             "arrival_date": str(arrival),
             "departure_date": str(departure),
             "want_electricity": want_elec,
@@ -48,23 +67,27 @@ def page_calculator():
             st.error(str(ex))
 
     # ----------- Compare Ports -----------
-    st.header("Compare with Another Port")
-    st.write("We'll do the same payload but for the other port to see approximate cost.")
+    st.header("Compare Ports")
+    st.write("Cheapest ports for the same boat, dates and extras, across every marina we track.")
+    top_k = st.number_input("How many ports:", min_value=1, max_value=50, value=5)
     if st.button("Compare Ports"):
-        other_port = "Puerto Marbella" if port_name == "Puerto Benalmadena" else "Puerto Benalmadena"
         payload = {
-            "port_name": other_port,
             "boat_length": boat_length,
+            "beam": beam or None,
             "arrival_date": str(arrival),
             "departure_date": str(departure),
             "want_electricity": want_elec,
-            "want_water": want_water
+            "want_water": want_water,
+            "top_k": int(top_k)
         }
         try:
-            resp = requests.post(f"{API_BASE}/calculate_price", json=payload)
+            resp = requests.post(f"{API_BASE}/rank_ports", json=payload)
             if resp.status_code == 200:
                 data = resp.json()
-                st.info(f"**{other_port}** => €{data['total_price']} ( {data['detail']} )")
+                if data:
+                    st.table(data)
+                else:
+                    st.info("No port has a tariff for this boat length.")
             else:
                 st.error(resp.text)
         except Exception as ex:
@@ -89,6 +112,67 @@ def page_calculator():
         except Exception as ex:
             st.error(str(ex))
 
+    # ----------- Earliest Free Window -----------
+    st.header("Find the Earliest Free Window")
+    nights = st.number_input("Consecutive nights:", min_value=1, max_value=366, value=7)
+    window_ports = st.multiselect("Ports:", known_ports(), default=known_ports())
+    if st.button("Find Window"):
+        window_payload = {
+            "boat_length": boat_length,
+            "nights": int(nights),
+            "after": str(arrival),
+            "ports": window_ports
+        }
+        try:
+            resp = requests.post(f"{API_BASE}/earliest_window", json=window_payload)
+            if resp.status_code == 200:
+                data = resp.json()
+                if data["earliest"]:
+                    best = data["earliest"]
+                    st.success(f"**{best['port_name']}** (berth {best['berth_id']}): "
+                               f"{best['start_date']} -> {best['end_date']}")
+                    st.table(data["by_port"])
+                else:
+                    st.info("No free window found in the next year.")
+            else:
+                st.error(resp.text)
+        except Exception as ex:
+            st.error(str(ex))
+
+    # ----------- Marinas Nearby -----------
+    st.header("Marinas Near a Point")
+    latitude = st.number_input("Latitude:", min_value=-90.0, max_value=90.0, value=36.55, format="%.4f")
+    longitude = st.number_input("Longitude:", min_value=-180.0, max_value=180.0, value=-4.70, format="%.4f")
+    radius_nm = st.number_input("Radius (nautical miles):", min_value=1.0, max_value=500.0, value=25.0)
+    if st.button("Search Marinas"):
+        nearby_payload = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "radius_nm": radius_nm,
+            "boat_length": boat_length,
+            "beam": beam or None,
+            "arrival_date": str(arrival),
+            "departure_date": str(departure),
+            "want_electricity": want_elec,
+            "want_water": want_water
+        }
+        try:
+            resp = requests.post(f"{API_BASE}/ports/nearby", json=nearby_payload)
+            if resp.status_code == 200:
+                marinas = resp.json()
+                if marinas:
+                    st.table([
+                        {"Port": m["port_name"], "Distance (nm)": m["distance_nm"],
+                         "Total (EUR)": m["total_price"], "Free berths": m["free_berths"]}
+                        for m in marinas
+                    ])
+                else:
+                    st.info("No marinas within that radius.")
+            else:
+                st.error(resp.text)
+        except Exception as ex:
+            st.error(str(ex))
+
 def page_cargo_ports():
     """
     Página que muestra información sobre puertos de mercancía.
@@ -124,17 +208,39 @@ def page_reservations():
 
     st.markdown("Fill in your boat details to confirm reservation:")
     with st.form("reservation_form"):
+        port_name = st.selectbox("Port:", known_ports())
         boat_name = st.text_input("Boat Name:")
         boat_length = st.number_input("Boat length (m):", 5.0, 50.0, 10.0)
         contact_email = st.text_input("Contact email:")
         submitted = st.form_submit_button("Reserve Now")
 
         if submitted:
-            st.success(
-                f"Reservation requested for boat **{boat_name}**, length={boat_length}m. "
-                f"We'll contact you to the email {contact_email} soon."
-            )
-            # Podrías hacer un requests.post al backend para guardar la reserva.
+            if not isinstance(date_range, tuple) or len(date_range) != 2:
+                st.error("Pick an arrival and a departure date.")
+            else:
+                payload = {
+                    "port_name": port_name,
+                    "boat_length": boat_length,
+                    "arrival_date": str(arr),
+                    "departure_date": str(dep),
+                    "boat_name": boat_name,
+                    "contact_email": contact_email
+                }
+                try:
+                    resp = requests.post(f"{API_BASE}/reservations", json=payload)
+                    if resp.status_code == 201:
+                        booking = resp.json()
+                        st.success(
+                            f"Reservation **{booking['reservation_id'][:8]}** confirmed for boat **{boat_name}** "
+                            f"(berth {booking['berth_id']}, {booking['nights']} nights). "
+                            f"We'll contact you to the email {contact_email} soon."
+                        )
+                    elif resp.status_code == 409:
+                        st.warning("No free berth for those dates. Try other dates or another port.")
+                    else:
+                        st.error(resp.text)
+                except Exception as ex:
+                    st.error(str(ex))
 
     # Mostrar una imagen de la marina
     st.markdown("---")  # separador
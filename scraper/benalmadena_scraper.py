@@ -1,49 +1,63 @@
 # scraper/benalmadena_scraper.py
 
-import requests
 from bs4 import BeautifulSoup
-from datetime import datetime
-from typing import List, Dict
+from itertools import chain
+from typing import Iterator, Optional
 import re
 
+from .http_client import FetchClient, get_client
+from .records import BandRecord, ServiceRecord, TariffRecord, scrape_timestamp
+
+PORT_NAME = "Puerto Benalmadena"
+
 class BenalmadenaScraper:
     """
     Scraper para la tabla de tarifas de Puerto Benalmádena.
-    Retorna una lista de diccionarios con la info parseada,
+    Devuelve los registros parseados (scraper/records.py) como un generador,
     en lugar de insertar directamente en la base de datos.
     """
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, client: Optional[FetchClient] = None):
         """
         :param url: URL de la página de Tarifas
+        :param client: cliente HTTP (por defecto, el compartido del proceso)
         """
         self.url = url
+        self.client = client or get_client()
 
-    def scrape(self) -> List[Dict]:
+    def scrape(self) -> Iterator[TariffRecord]:
         """
-        Realiza la petición HTTP a la URL, parsea las tablas
-        y retorna una lista con todos los registros extraídos.
+        Realiza la petición HTTP a la URL (aquí mismo, para que un fallo de red
+        se note antes de tocar la base de datos) y devuelve un generador con
+        los registros de todas las tablas, uno detrás de otro.
         """
-        print(f"[SCRAPER] Scraping URL: {self.url}")
-        response = requests.get(self.url)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Extraemos datos de las tablas relevantes (tablepress-17, -18, -19, etc.)
-        t1_data = self.parse_table_17(soup)  # T.1: Tarifas diarias
-        t2_data = self.parse_table_18(soup)  # Exceso de medidas
-        t4_elec = self.parse_table_19(soup)  # Electricidad
-        t4_agua = self.parse_table_20(soup)  # Agua
-        t4_enchufes = self.parse_table_21(soup)  # Enchufes
-
-        # Combinamos todo en un solo array
-        all_data = t1_data + t2_data + t4_elec + t4_agua + t4_enchufes
+        return self.parse(self.fetch())
 
-        print(f"[SCRAPER] Total registros extraídos de Puerto Benalmadena: {len(all_data)}\n")
-        return all_data
+    def fetch(self) -> str:
+        """
+        Descarga la página de tarifas y devuelve su HTML.
+        """
+        print(f"[SCRAPER] Scraping URL: {self.url}")
+        return self.client.get(self.url, port_name=PORT_NAME).text
 
-    def parse_table_17(self, soup: BeautifulSoup) -> List[Dict]:
+    def parse(self, html: str) -> Iterator[TariffRecord]:
+        """
+        Parsea el HTML ya descargado (el planificador lo compara antes con
+        el de la última vez y no lo parsea si no ha cambiado).
+        """
+        soup = BeautifulSoup(html, "html.parser")
+        scraped_at = scrape_timestamp()  # una sola marca de tiempo por scrape
+
+        # Tablas relevantes (tablepress-17, -18, -19, etc.), sin listas intermedias
+        return chain(
+            self.parse_table_17(soup, scraped_at),  # T.1: Tarifas diarias
+            self.parse_table_18(soup, scraped_at),  # Exceso de medidas
+            self.parse_table_19(soup, scraped_at),  # Electricidad
+            self.parse_table_20(soup, scraped_at),  # Agua
+            self.parse_table_21(soup, scraped_at),  # Enchufes
+        )
+
+    def parse_table_17(self, soup: BeautifulSoup, scraped_at: str) -> Iterator[TariffRecord]:
         """
         T.1 TARIFAS DIARIAS DE ALQUILER DE AMARRES
         - ID tabla: tablepress-17
@@ -53,10 +67,10 @@ class BenalmadenaScraper:
         table = soup.find("table", {"id": "tablepress-17"})
         if not table:
             print("[SCRAPER] No se encontró tablepress-17.")
-            return []
+            return
 
         rows = table.find_all("tr")[2:]  # saltamos 2 filas de cabecera
-        data = []
+        count = 0
         for row in rows:
             cols = row.find_all("td")
             if len(cols) < 4:
@@ -74,29 +88,23 @@ class BenalmadenaScraper:
                 alta_val = self.extract_numeric(alta_str)  # p.ej 6.2513
                 baja_val = self.extract_numeric(baja_str)
 
-                record = {
-                    "port_name": "Puerto Benalmadena",
-                    "table_name": "T1 Tarifas Diarias",
-                    "boat_length_min": eslora,
-                    "boat_length_max": eslora,  # en este caso es único
-                    "manga": manga,
-                    "price_high_season": alta_val,
-                    "price_low_season": baja_val,
-                    "iva_included": False,
-                    "water_included": False,
-                    "electricity_included": False,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-
-                data.append(record)
-                print(f" [T1] Parsed: {record}")
+                yield BandRecord(
+                    port_name=PORT_NAME,
+                    table_name="T1 Tarifas Diarias",
+                    boat_length_min=eslora,
+                    boat_length_max=eslora,  # en este caso es único
+                    manga=manga,
+                    price_high_season=alta_val,
+                    price_low_season=baja_val,
+                    timestamp=scraped_at
+                )
+                count += 1
             except Exception as e:
                 print(f" [T1] Error parseando fila: {e}")
 
-        print(f"[SCRAPER] T1 => {len(data)} filas extraídas.")
-        return data
+        print(f"[SCRAPER] T1 => {count} filas extraídas.")
 
-    def parse_table_18(self, soup: BeautifulSoup) -> List[Dict]:
+    def parse_table_18(self, soup: BeautifulSoup, scraped_at: str) -> Iterator[TariffRecord]:
         """
         EXCESO DE MEDIDAS BARCOS
         - ID tabla: tablepress-18
@@ -105,10 +113,10 @@ class BenalmadenaScraper:
         table = soup.find("table", {"id": "tablepress-18"})
         if not table:
             print("[SCRAPER] No se encontró tablepress-18.")
-            return []
+            return
 
         rows = table.find_all("tr")[2:]
-        data = []
+        count = 0
         for row in rows:
             cols = row.find_all("td")
             if len(cols) < 4:
@@ -126,28 +134,23 @@ class BenalmadenaScraper:
                 alta_val = self.extract_numeric(alta_str)
                 baja_val = self.extract_numeric(baja_str)
 
-                record = {
-                    "port_name": "Puerto Benalmadena",
-                    "table_name": "T2 Exceso de Medidas",
-                    "boat_length_min": eslora,
-                    "boat_length_max": eslora,
-                    "manga": manga,
-                    "price_high_season": alta_val,
-                    "price_low_season": baja_val,
-                    "iva_included": False,
-                    "water_included": False,
-                    "electricity_included": False,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-                data.append(record)
-                print(f" [T2] Parsed: {record}")
+                yield BandRecord(
+                    port_name=PORT_NAME,
+                    table_name="T2 Exceso de Medidas",
+                    boat_length_min=eslora,
+                    boat_length_max=eslora,
+                    manga=manga,
+                    price_high_season=alta_val,
+                    price_low_season=baja_val,
+                    timestamp=scraped_at
+                )
+                count += 1
             except Exception as e:
                 print(f" [T2] Error parseando fila: {e}")
 
-        print(f"[SCRAPER] T2 => {len(data)} filas extraídas.")
-        return data
+        print(f"[SCRAPER] T2 => {count} filas extraídas.")
 
-    def parse_table_19(self, soup: BeautifulSoup) -> List[Dict]:
+    def parse_table_19(self, soup: BeautifulSoup, scraped_at: str) -> Iterator[TariffRecord]:
         """
         T.4 (4.1) ELECTRICIDAD
         - ID tabla: tablepress-19
@@ -159,10 +162,10 @@ class BenalmadenaScraper:
         table = soup.find("table", {"id": "tablepress-19"})
         if not table:
             print("[SCRAPER] No se encontró tablepress-19 (Electricidad).")
-            return []
+            return
 
         rows = table.find_all("tr")
-        data = []
+        count = 0
         for row in rows:
             cols = row.find_all("td")
             if len(cols) < 3:
@@ -173,23 +176,20 @@ class BenalmadenaScraper:
             right = cols[2].get_text(strip=True)
 
             numeric_val = self.extract_numeric(right)
-            record = {
-                "port_name": "Puerto Benalmadena",
-                "table_name": "T4.1 Electricidad",
-                "description_left": left,
-                "description_mid": mid,
-                "price_extracted": numeric_val,
-                "unit": "Kw/h" if "Kw/h" in right else "EUR/day",
-                "iva_included": False,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            data.append(record)
-            print(f" [T4-ELEC] Parsed: {record}")
-
-        print(f"[SCRAPER] T4-ELEC => {len(data)} filas extraídas.")
-        return data
-
-    def parse_table_20(self, soup: BeautifulSoup) -> List[Dict]:
+            yield ServiceRecord(
+                port_name=PORT_NAME,
+                table_name="T4.1 Electricidad",
+                price_extracted=numeric_val,
+                unit="Kw/h" if "Kw/h" in right else "EUR/day",
+                timestamp=scraped_at,
+                description_left=left,
+                description_mid=mid
+            )
+            count += 1
+
+        print(f"[SCRAPER] T4-ELEC => {count} filas extraídas.")
+
+    def parse_table_20(self, soup: BeautifulSoup, scraped_at: str) -> Iterator[TariffRecord]:
         """
         4.2 AGUA
         - ID tabla: tablepress-20
@@ -198,10 +198,10 @@ class BenalmadenaScraper:
         table = soup.find("table", {"id": "tablepress-20"})
         if not table:
             print("[SCRAPER] No se encontró tablepress-20 (Agua).")
-            return []
+            return
 
         rows = table.find_all("tr")
-        data = []
+        count = 0
         for row in rows:
             cols = row.find_all("td")
             if len(cols) < 3:
@@ -212,23 +212,20 @@ class BenalmadenaScraper:
             c2 = cols[2].get_text(strip=True)
 
             numeric_val = self.extract_numeric(c2)
-            record = {
-                "port_name": "Puerto Benalmadena",
-                "table_name": "T4.2 Agua",
-                "description_left": c0,
-                "description_mid": c1,
-                "price_extracted": numeric_val,
-                "unit": "M3" if "M3" in c2 else "EUR/day",
-                "iva_included": False,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            data.append(record)
-            print(f" [T4-AGUA] Parsed: {record}")
-
-        print(f"[SCRAPER] T4-AGUA => {len(data)} filas extraídas.")
-        return data
-
-    def parse_table_21(self, soup: BeautifulSoup) -> List[Dict]:
+            yield ServiceRecord(
+                port_name=PORT_NAME,
+                table_name="T4.2 Agua",
+                price_extracted=numeric_val,
+                unit="M3" if "M3" in c2 else "EUR/day",
+                timestamp=scraped_at,
+                description_left=c0,
+                description_mid=c1
+            )
+            count += 1
+
+        print(f"[SCRAPER] T4-AGUA => {count} filas extraídas.")
+
+    def parse_table_21(self, soup: BeautifulSoup, scraped_at: str) -> Iterator[TariffRecord]:
         """
         4.3 ENCHUFES
         - ID tabla: tablepress-21
@@ -239,10 +236,10 @@ class BenalmadenaScraper:
         table = soup.find("table", {"id": "tablepress-21"})
         if not table:
             print("[SCRAPER] No se encontró tablepress-21 (Enchufes).")
-            return []
+            return
 
         rows = table.find_all("tr")
-        data = []
+        count = 0
         for row in rows:
             cols = row.find_all("td")
             if len(cols) < 2:
@@ -252,20 +249,17 @@ class BenalmadenaScraper:
             c1 = cols[1].get_text(strip=True)
 
             numeric_val = self.extract_numeric(c1)
-            record = {
-                "port_name": "Puerto Benalmadena",
-                "table_name": "T4.3 Enchufes",
-                "description_left": c0,
-                "price_extracted": numeric_val,
-                "unit": "Ud." if "Ud." in c1 else "",
-                "iva_included": False,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            data.append(record)
-            print(f" [T4-ENCHUFES] Parsed: {record}")
-
-        print(f"[SCRAPER] T4-ENCHUFES => {len(data)} filas extraídas.")
-        return data
+            yield ServiceRecord(
+                port_name=PORT_NAME,
+                table_name="T4.3 Enchufes",
+                price_extracted=numeric_val,
+                unit="Ud." if "Ud." in c1 else "",
+                timestamp=scraped_at,
+                description_left=c0
+            )
+            count += 1
+
+        print(f"[SCRAPER] T4-ENCHUFES => {count} filas extraídas.")
 
     def extract_numeric(self, text: str) -> float:
         """
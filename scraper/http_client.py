@@ -0,0 +1,257 @@
+# scraper/http_client.py
+import os
+import random
+import ssl
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CERTS_DIR = os.getenv("CERTS_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "certs"))
+
+# ssl.VERIFY_X509_PARTIAL_CHAIN solo existe desde Python 3.10
+VERIFY_X509_PARTIAL_CHAIN = getattr(ssl, "VERIFY_X509_PARTIAL_CHAIN", 0x80000)
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """
+    El circuito del puerto está abierto: demasiados fallos seguidos,
+    no se intenta la petición hasta que pase reset_timeout.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por puerto:
+      - cerrado: las peticiones pasan; cuenta fallos consecutivos.
+      - abierto: tras `failure_threshold` fallos, rechaza al instante durante `reset_timeout` s.
+      - semiabierto: pasado ese tiempo deja pasar una petición de prueba;
+        si va bien se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                # Una sola petición de prueba: se reabre hasta conocer el resultado
+                self.opened_at = time.monotonic()
+                return True
+            return state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class PinnedAdapter(HTTPAdapter):
+    """
+    Adapter HTTPS que solo confía en las CA de `cafile` (guardado en certs/):
+    la CA emisora del host o su raíz, que duran años, no el certificado
+    del servidor, que caduca con cada renovación.
+    Con VERIFY_X509_PARTIAL_CHAIN la cadena puede terminar en una CA
+    intermedia del fichero, aunque no sea raíz.
+    """
+
+    def __init__(self, cafile: str, **kwargs):
+        self.ssl_context = ssl.create_default_context(cafile=cafile)
+        self.ssl_context.verify_flags |= VERIFY_X509_PARTIAL_CHAIN
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self.ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs["ssl_context"] = self.ssl_context
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+    def cert_verify(self, conn, url, verify, cert):
+        super().cert_verify(conn, url, verify, cert)
+        # No añadir el bundle por defecto (certifi) al contexto fijado
+        conn.ca_certs = None
+        conn.ca_cert_dir = None
+
+
+def _pin_problem(cafile: str) -> Optional[str]:
+    """
+    Motivo por el que un fichero de certs/ no sirve como pin, o None.
+    Solo valen certificados de CA vigentes: un certificado de servidor
+    (hoja) deja de valer en cuanto la web lo renueva.
+    """
+    try:
+        ca_certs = ssl.create_default_context(cafile=cafile).get_ca_certs()
+    except (ssl.SSLError, OSError) as e:
+        return f"no se puede leer ({e})"
+    if not ca_certs:
+        return "no contiene ningún certificado de CA (¿es el certificado del servidor?)"
+    now = time.time()
+    if all(ssl.cert_time_to_seconds(cert["notAfter"]) < now for cert in ca_certs):
+        return "todas sus CA han caducado"
+    return None
+
+
+def load_pins(certs_dir: str = CERTS_DIR) -> Dict[str, str]:
+    """
+    Lee certs/: cada fichero <dominio>.crt fija ese dominio.
+    Un "_" inicial equivale a un comodín: "_.marbella.es.crt" => *.marbella.es
+    Los ficheros inservibles (sin CA o caducados) se ignoran con un aviso;
+    ese dominio se verifica entonces con el bundle por defecto.
+    """
+    pins = {}
+    if not os.path.isdir(certs_dir):
+        return pins
+    for name in os.listdir(certs_dir):
+        if name.endswith((".crt", ".pem")):
+            cafile = os.path.join(certs_dir, name)
+            problem = _pin_problem(cafile)
+            if problem:
+                print(f"[SCRAPER] AVISO: pin {cafile} ignorado: {problem}")
+                continue
+            domain = name.rsplit(".", 1)[0]
+            if domain.startswith("_."):
+                domain = "*" + domain[1:]
+            pins[domain] = cafile
+    return pins
+
+
+def _pin_for(host: str, pins: Dict[str, str]) -> Optional[str]:
+    for domain, cafile in pins.items():
+        if domain == host or (domain.startswith("*.") and host.endswith(domain[1:])):
+            return cafile
+    return None
+
+
+class FetchClient:
+    """
+    Cliente HTTP compartido por todos los scrapers:
+      - sesión con pool de conexiones keep-alive,
+      - timeouts de conexión y lectura,
+      - reintentos con backoff exponencial y jitter (errores de red, 429 y 5xx),
+      - circuit breaker por puerto,
+      - certificados fijados por host desde certs/ (sin verify=False).
+    El tiempo total de un get() está acotado por `deadline` segundos.
+    """
+
+    def __init__(self, timeout: Tuple[float, float] = (5.0, 20.0), retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 8.0, deadline: float = 60.0,
+                 pins: Optional[Dict[str, str]] = None, pool_size: int = 10):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.pins = load_pins() if pins is None else pins
+        self.pool_size = pool_size
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._pinned_hosts = set()
+
+    def _ensure_pin(self, host: str, netloc: str):
+        if netloc in self._pinned_hosts:
+            return
+        with self._lock:
+            cafile = _pin_for(host, self.pins)
+            if cafile:
+                # netloc incluye el puerto si la URL lo lleva: el prefijo montado debe coincidir
+                self.session.mount(f"https://{netloc}/", PinnedAdapter(
+                    cafile, pool_connections=1, pool_maxsize=self.pool_size, max_retries=0))
+            self._pinned_hosts.add(netloc)
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        with self._lock:
+            if key not in self.breakers:
+                self.breakers[key] = CircuitBreaker()
+            return self.breakers[key]
+
+    def _sleep_before_retry(self, attempt: int, started: float) -> bool:
+        """
+        Espera con "full jitter": uniforme entre 0 y min(max_backoff, backoff * 2^attempt).
+        Devuelve False si la espera sobrepasaría el deadline.
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if time.monotonic() - started + delay > self.deadline:
+            return False
+        time.sleep(delay)
+        return True
+
+    def get(self, url: str, port_name: Optional[str] = None) -> requests.Response:
+        parsed = urlparse(url)
+        host = parsed.hostname or ""
+        self._ensure_pin(host, parsed.netloc)
+        breaker = self.breaker(port_name or host)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {port_name or host}, skipping {url}")
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    breaker.record_success()
+                    return response
+                error: Exception = requests.HTTPError(f"{response.status_code} for {url}", response=response)
+            except requests.exceptions.SSLError:
+                # Certificado que no coincide con el fijado: reintentar no sirve
+                breaker.record_failure()
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.HTTPError:
+                # 4xx distinto de 429: no se arregla reintentando
+                breaker.record_failure()
+                raise
+
+            if attempt >= self.retries or not self._sleep_before_retry(attempt, started):
+                breaker.record_failure()
+                raise error
+            attempt += 1
+            print(f"[SCRAPER] Reintento {attempt}/{self.retries} de {url}: {error}")
+
+
+_client: Optional[FetchClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> FetchClient:
+    """
+    Cliente compartido del proceso (pool y circuit breakers comunes a todos los scrapers).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = FetchClient()
+        return _client
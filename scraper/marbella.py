@@ -1,35 +1,45 @@
 # scraper/marbella_scraper.py
-import requests
-import warnings
-
-from urllib3.exceptions import InsecureRequestWarning
-
 from bs4 import BeautifulSoup
-from datetime import datetime
-from typing import List, Dict
+from itertools import chain
+from typing import Iterator, Optional
 import re
 
+from .http_client import FetchClient, get_client
+from .records import AnnualRecord, BandRecord, ServiceRecord, TariffRecord, scrape_timestamp
+
+PORT_NAME = "Puerto Marbella"
+
 
 class MarbellaScraper:
     """
     Scraper para la web de Puerto Deportivo de Marbella.
     Extrae los datos de tarifas en Temporada Baja, Alta, Anual
-    y tablas de Tasas T0, devolviendo un array de diccionarios.
+    y tablas de Tasas T0, devolviendo un generador de registros
+    (scraper/records.py).
     """
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, client: Optional[FetchClient] = None):
         """
         :param url: URL de la página de Tarifas de Puerto Marbella
+        :param client: cliente HTTP (por defecto, el compartido del proceso);
+                       verifica con el certificado fijado en certs/
         """
         self.url = url
-        # Ignorar warnings de SSL
-        warnings.simplefilter('ignore', InsecureRequestWarning)
-    def scrape(self) -> List[Dict]:
+        self.client = client or get_client()
+
+    def scrape(self) -> Iterator[TariffRecord]:
+        return self.parse(self.fetch())
+
+    def fetch(self) -> str:
+        """
+        Descarga la página de tarifas y devuelve su HTML.
+        """
         print(f"[SCRAPER] Scraping URL (Marbella): {self.url}")
-        response = requests.get(self.url, verify=False)
-        response.raise_for_status()
+        return self.client.get(self.url, port_name=PORT_NAME).text
 
-        soup = BeautifulSoup(response.text, "html.parser")
+    def parse(self, html: str) -> Iterator[TariffRecord]:
+        soup = BeautifulSoup(html, "html.parser")
+        scraped_at = scrape_timestamp()
 
         # Extraeremos 5 tablas principales:
         # 1) Temporada Baja
@@ -37,36 +47,34 @@ class MarbellaScraper:
         # 3) Tarifa Anual
         # 4) Tasa T0 base en puerto español
         # 5) Tasa T0 base en puerto extranjero
-        # Cada una parseada con un método
-
-        baja_data  = self.parse_temporada_baja(soup)
-        alta_data  = self.parse_temporada_alta(soup)
-        anual_data = self.parse_tarifa_anual(soup)
-        t0_esp     = self.parse_t0_esp(soup)
-        t0_ext     = self.parse_t0_ext(soup)
-
-        all_data = baja_data + alta_data + anual_data + t0_esp + t0_ext
-        print(f"[SCRAPER] Total registros extraídos de Puerto Marbella: {len(all_data)}\n")
-        return all_data
+        # Cada una parseada con un método (generador): las filas se parsean
+        # a medida que la ingesta las consume.
+        return chain(
+            self.parse_temporada_baja(soup, scraped_at),
+            self.parse_temporada_alta(soup, scraped_at),
+            self.parse_tarifa_anual(soup, scraped_at),
+            self.parse_t0_esp(soup, scraped_at),
+            self.parse_t0_ext(soup, scraped_at),
+        )
 
     # -----------------------------------------------------
     # 1) TEMPORADA BAJA
     # -----------------------------------------------------
-    def parse_temporada_baja(self, soup: BeautifulSoup) -> List[Dict]:
+    def parse_temporada_baja(self, soup: BeautifulSoup, scraped_at: str) -> Iterator[TariffRecord]:
         """
         Temporada Baja table:
           <table> con thead = "TEMPORADA BAJA"
           Estructura col0=Eslora, col1=PRECIO S/IVA, col2=luz, col3=agua, col4=Tasa T0?, col5=Total IVA
         """
-        result = []
         # Buscamos la tabla que en <thead> contenga "TEMPORADA BAJA"
         table_baja = self.find_table_by_thead_text(soup, "TEMPORADA BAJA")
         if not table_baja:
             print("[SCRAPER] No se encontró la tabla de Temporada Baja en Marbella.")
-            return result
+            return
 
         # Filas <tr> tras thead
         rows = table_baja.find("tbody").find_all("tr")
+        count = 0
         for row in rows:
             cols = row.find_all("td")
             if len(cols) < 6:
@@ -85,49 +93,42 @@ class MarbellaScraper:
             esl, man = self.parse_eslora_manga(eslora_str)
 
             sin_iva_val = self.extract_numeric(sin_iva_str)
-            luz_val = self.extract_numeric(luz_str)
-            agua_val = self.extract_numeric(agua_str)
-            t0_val = self.extract_numeric(t0_str)
-            total_iva_val = self.extract_numeric(total_iva_str)
-
-            record = {
-                "port_name": "Puerto Marbella",
-                "table_name": "Tarifa Diaria Temporada Baja",
-                "boat_length_min": esl,
-                "boat_length_max": esl,  # lo consideramos igual (o podrías usar 'man' si deseas)
-                "manga": man,
-                "price_without_iva": sin_iva_val,
-                "price_high_season": 0.0,
-                "price_low_season": sin_iva_val,  # no aplica
-                "electricity_cost": luz_val,
-                "water_cost": agua_val,
-                "t0_cost": t0_val,
-                "price_total_iva": total_iva_val,
-                "season": "low",
-                "iva_included": False,  # la web dice "Estos precios no incluyen IVA 21%"
-                "timestamp": datetime.utcnow().isoformat(),
-                "electricity_included": False,
-                "water_included": False
-            }
-            result.append(record)
-            print(f" [BAJA] {record}")
-
-        return result
+
+            yield BandRecord(
+                port_name=PORT_NAME,
+                table_name="Tarifa Diaria Temporada Baja",
+                boat_length_min=esl,
+                boat_length_max=esl,  # lo consideramos igual (o podrías usar 'man' si deseas)
+                manga=man,
+                price_high_season=0.0,
+                price_low_season=sin_iva_val,
+                timestamp=scraped_at,
+                iva_included=False,  # la web dice "Estos precios no incluyen IVA 21%"
+                season="low",
+                price_without_iva=sin_iva_val,
+                electricity_cost=self.extract_numeric(luz_str),
+                water_cost=self.extract_numeric(agua_str),
+                t0_cost=self.extract_numeric(t0_str),
+                price_total_iva=self.extract_numeric(total_iva_str)
+            )
+            count += 1
+
+        print(f"[SCRAPER] BAJA => {count} filas extraídas.")
 
     # -----------------------------------------------------
     # 2) TEMPORADA ALTA
     # -----------------------------------------------------
-    def parse_temporada_alta(self, soup: BeautifulSoup) -> List[Dict]:
+    def parse_temporada_alta(self, soup: BeautifulSoup, scraped_at: str) -> Iterator[TariffRecord]:
         """
         Similar a parse_temporada_baja, pero la <thead> = "TEMPORADA ALTA"
         """
-        result = []
         table_alta = self.find_table_by_thead_text(soup, "TEMPORADA ALTA")
         if not table_alta:
             print("[SCRAPER] No se encontró la tabla de Temporada Alta en Marbella.")
-            return result
+            return
 
         rows = table_alta.find("tbody").find_all("tr")
+        count = 0
         for row in rows:
             cols = row.find_all("td")
             if len(cols) < 6:
@@ -142,37 +143,32 @@ class MarbellaScraper:
 
             esl, man = self.parse_eslora_manga(eslora_str)
             sin_iva_val = self.extract_numeric(sin_iva_str)
-            luz_val = self.extract_numeric(luz_str)
-            agua_val = self.extract_numeric(agua_str)
-            t0_val = self.extract_numeric(t0_str)
-            total_iva_val = self.extract_numeric(total_iva_str)
-
-            record = {
-                "port_name": "Puerto Marbella",
-                "table_name": "Tarifa Diaria Temporada Alta",
-                "boat_length_min": esl,
-                "boat_length_max": esl,
-                "manga": man,
-                "price_without_iva": sin_iva_val,
-                "price_high_season": sin_iva_val,
-                "price_low_season": 0.0,
-                "electricity_cost": luz_val,
-                "water_cost": agua_val,
-                "t0_cost": t0_val,
-                "price_total_iva": total_iva_val,
-                "season": "high",
-                "iva_included": False,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            result.append(record)
-            print(f" [ALTA] {record}")
-
-        return result
+
+            yield BandRecord(
+                port_name=PORT_NAME,
+                table_name="Tarifa Diaria Temporada Alta",
+                boat_length_min=esl,
+                boat_length_max=esl,
+                manga=man,
+                price_high_season=sin_iva_val,
+                price_low_season=0.0,
+                timestamp=scraped_at,
+                iva_included=False,
+                season="high",
+                price_without_iva=sin_iva_val,
+                electricity_cost=self.extract_numeric(luz_str),
+                water_cost=self.extract_numeric(agua_str),
+                t0_cost=self.extract_numeric(t0_str),
+                price_total_iva=self.extract_numeric(total_iva_str)
+            )
+            count += 1
+
+        print(f"[SCRAPER] ALTA => {count} filas extraídas.")
 
     # -----------------------------------------------------
     # 3) TARIFA ANUAL
     # -----------------------------------------------------
-    def parse_tarifa_anual(self, soup: BeautifulSoup) -> List[Dict]:
+    def parse_tarifa_anual(self, soup: BeautifulSoup, scraped_at: str) -> Iterator[TariffRecord]:
         """
         <thead><th colspan="5"><strong>TARIFA ANUAL</strong></th></thead>
         Columnas:
@@ -182,13 +178,13 @@ class MarbellaScraper:
           - Agua + luz
           - TOTAL
         """
-        result = []
         table_anual = self.find_table_by_thead_text(soup, "TARIFA ANUAL")
         if not table_anual:
             print("[SCRAPER] No se encontró la tabla de Tarifa Anual en Marbella.")
-            return result
+            return
 
         rows = table_anual.find("tbody").find_all("tr")
+        count = 0
         for row in rows:
             cols = row.find_all("td")
             if len(cols) < 5:
@@ -201,100 +197,80 @@ class MarbellaScraper:
             total_str = cols[4].get_text(strip=True)
 
             esl, man = self.parse_eslora_manga(eslora_str)
-            anual_sin_iva_val = self.extract_numeric(anual_sin_iva_str)
-            agua_luz_val = self.extract_numeric(agua_luz_str)
-            total_val = self.extract_numeric(total_str)
-
-            record = {
-                "port_name": "Puerto Marbella",
-                "table_name": "Tarifa Anual",
-                "boat_length_min": esl,
-                "boat_length_max": esl,
-                "manga": man,
-                "price_annual_without_iva": anual_sin_iva_val,
-                "descuento": descuento_str,
-                "agua_luz": agua_luz_val,
-                "price_annual_total": total_val,
-                "iva_included": False,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            result.append(record)
-            print(f" [ANUAL] {record}")
-
-        return result
+
+            yield AnnualRecord(
+                port_name=PORT_NAME,
+                table_name="Tarifa Anual",
+                boat_length_min=esl,
+                boat_length_max=esl,
+                manga=man,
+                price_annual_without_iva=self.extract_numeric(anual_sin_iva_str),
+                descuento=descuento_str,
+                agua_luz=self.extract_numeric(agua_luz_str),
+                price_annual_total=self.extract_numeric(total_str),
+                timestamp=scraped_at
+            )
+            count += 1
+
+        print(f"[SCRAPER] ANUAL => {count} filas extraídas.")
 
     # -----------------------------------------------------
     # 4) T0 base en puerto ESPAÑOL
     # -----------------------------------------------------
-    def parse_t0_esp(self, soup: BeautifulSoup) -> List[Dict]:
+    def parse_t0_esp(self, soup: BeautifulSoup, scraped_at: str) -> Iterator[TariffRecord]:
         """
         La tabla con <h4>BARCOS CON BASE EN PUERTO ESPAÑOL, EXENTO DE I.V.A.
         Columnas: TIPO / ESLORA, PRECIO
         """
-        result = []
         # Buscamos la tabla con thead = "TIPO / ESLORA" y <h4> contenga "PUERTO ESPAÑOL"
         table_esp = self.find_table_by_thead_text(soup, "TIPO / ESLORA", heading="PUERTO ESPAÑOL")
         if not table_esp:
             print("[SCRAPER] No se encontró la tabla T0 base en puerto español.")
-            return result
+            return
 
-        rows = table_esp.find("tbody").find_all("tr")
-        for row in rows:
-            cols = row.find_all("td")
-            if len(cols) < 2:
-                continue
-            tipo_eslora_str = cols[0].get_text(strip=True)  # "Motor - eslora >= 9m"
-            precio_str       = cols[1].get_text(strip=True)  # "9,12€ / m2 / año"
-
-            record = {
-                "port_name": "Puerto Marbella",
-                "table_name": "T0 Base Puerto Español",
-                "tipo_eslora": tipo_eslora_str,
-                "price_extracted": self.extract_numeric(precio_str),
-                "unit": "/m2/año" if "/m2" in precio_str else "",
-                "iva_included": False,  # exento
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            result.append(record)
-            print(f" [T0-ESP] {record}")
-
-        return result
+        yield from self._parse_t0(table_esp, "T0 Base Puerto Español", "/m2/año", scraped_at)
 
     # -----------------------------------------------------
     # 5) T0 base en puerto EXTRANJERO
     # -----------------------------------------------------
-    def parse_t0_ext(self, soup: BeautifulSoup) -> List[Dict]:
+    def parse_t0_ext(self, soup: BeautifulSoup, scraped_at: str) -> Iterator[TariffRecord]:
         """
         Similar a parse_t0_esp, pero la <h4> contenga "PUERTO EXTRANJERO".
         """
-        result = []
         table_ext = self.find_table_by_thead_text(soup, "TIPO / ESLORA", heading="PUERTO EXTRANJERO")
         if not table_ext:
             print("[SCRAPER] No se encontró la tabla T0 base en puerto extranjero.")
-            return result
+            return
 
-        rows = table_ext.find("tbody").find_all("tr")
+        yield from self._parse_t0(table_ext, "T0 Base Puerto Extranjero", "/m2/día", scraped_at)
+
+    def _parse_t0(self, table, table_name: str, unit: str, scraped_at: str) -> Iterator[TariffRecord]:
+        """
+        Filas de una tabla T0: TIPO / ESLORA | PRECIO (p.ej "9,12€ / m2 / año").
+        Exentas de IVA.
+        """
+        rows = table.find("tbody").find_all("tr")
+        count = 0
         for row in rows:
             cols = row.find_all("td")
             if len(cols) < 2:
                 continue
 
-            tipo_eslora_str = cols[0].get_text(strip=True)
-            precio_str       = cols[1].get_text(strip=True)
-
-            record = {
-                "port_name": "Puerto Marbella",
-                "table_name": "T0 Base Puerto Extranjero",
-                "tipo_eslora": tipo_eslora_str,
-                "price_extracted": self.extract_numeric(precio_str),
-                "unit": "/m2/día" if "/m2" in precio_str else "",
-                "iva_included": False,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            result.append(record)
-            print(f" [T0-EXT] {record}")
-
-        return result
+            tipo_eslora_str = cols[0].get_text(strip=True)  # "Motor - eslora >= 9m"
+            precio_str       = cols[1].get_text(strip=True)  # "9,12€ / m2 / año"
+
+            yield ServiceRecord(
+                port_name=PORT_NAME,
+                table_name=table_name,
+                price_extracted=self.extract_numeric(precio_str),
+                unit=unit if "/m2" in precio_str else "",
+                timestamp=scraped_at,
+                iva_included=False,  # exento
+                tipo_eslora=tipo_eslora_str
+            )
+            count += 1
+
+        print(f"[SCRAPER] {table_name} => {count} filas extraídas.")
 
     # -----------------------------------------------------
     # Helpers
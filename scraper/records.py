@@ -0,0 +1,91 @@
+# scraper/records.py
+"""
+Registros tipados que producen los scrapers.
+
+Son NamedTuple (sin __dict__ por instancia): los nombres de campo viven en
+la clase y no en cada fila, y los textos repetidos (puerto, tabla, marca de
+tiempo) son el mismo objeto en todas las filas de un scrape.
+Se convierten a documento de Mongo solo al insertarlos (to_document).
+"""
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Union
+
+
+def _to_document(record) -> Dict:
+    """
+    Documento para 'pricing' con los campos presentes (los None se omiten).
+    """
+    return {name: value for name, value in zip(record._fields, record) if value is not None}
+
+
+class BandRecord(NamedTuple):
+    """
+    Fila de tarifa diaria por eslora/manga (temporada alta y/o baja).
+    """
+    port_name: str
+    table_name: str
+    boat_length_min: float
+    boat_length_max: float
+    manga: float
+    price_high_season: float
+    price_low_season: float
+    timestamp: str
+    iva_included: bool = False
+    water_included: bool = False
+    electricity_included: bool = False
+    # Solo Marbella: desglose de la tabla por temporada
+    season: Optional[str] = None
+    price_without_iva: Optional[float] = None
+    electricity_cost: Optional[float] = None
+    water_cost: Optional[float] = None
+    t0_cost: Optional[float] = None
+    price_total_iva: Optional[float] = None
+
+    to_document = _to_document
+
+
+class AnnualRecord(NamedTuple):
+    """
+    Fila de tarifa anual por eslora/manga.
+    """
+    port_name: str
+    table_name: str
+    boat_length_min: float
+    boat_length_max: float
+    manga: float
+    price_annual_without_iva: float
+    descuento: str
+    agua_luz: float
+    price_annual_total: float
+    timestamp: str
+    iva_included: bool = False
+
+    to_document = _to_document
+
+
+class ServiceRecord(NamedTuple):
+    """
+    Fila de servicios y tasas (electricidad, agua, enchufes, T0):
+    un precio con su unidad y la descripción de la web.
+    """
+    port_name: str
+    table_name: str
+    price_extracted: float
+    unit: str
+    timestamp: str
+    iva_included: bool = False
+    description_left: Optional[str] = None
+    description_mid: Optional[str] = None
+    tipo_eslora: Optional[str] = None
+
+    to_document = _to_document
+
+
+TariffRecord = Union[BandRecord, AnnualRecord, ServiceRecord]
+
+
+def scrape_timestamp() -> str:
+    """
+    Marca de tiempo común a todas las filas de un mismo scrape.
+    """
+    return datetime.utcnow().isoformat()
@@ -1,21 +1,56 @@
 # scraper/run_scrapers.py
+from itertools import chain
+from typing import Iterator, List, Optional
+
 from .benalmadena_scraper import BenalmadenaScraper
 from .marbella import MarbellaScraper
+from .records import TariffRecord
 
 
 # from .other_scraper import OtherMarinaScraper  # si tuvieras otro
 
-def run_all_scrapers():
-    benalmadena_url = "https://puertobenalmadena.es/tarifas/"
-    marbella_url = "https://puertodeportivo.marbella.es/servicios-y-tarifas/tarifa-de-alquiler-de-atraques.html"
+# Registro de puertos: nombre del puerto => (clase del scraper, URL de tarifas)
+SCRAPERS = {
+    "Puerto Benalmadena": (BenalmadenaScraper, "https://puertobenalmadena.es/tarifas/"),
+    "Puerto Marbella": (
+        MarbellaScraper,
+        "https://puertodeportivo.marbella.es/servicios-y-tarifas/tarifa-de-alquiler-de-atraques.html"
+    ),
+}
+
+
+def fetch_port(port_name: str) -> str:
+    """
+    Descarga la página de tarifas de un puerto registrado en SCRAPERS.
+    """
+    scraper_cls, url = SCRAPERS[port_name]
+    return scraper_cls(url).fetch()
+
 
-    # Instanciamos
-    b_scraper = BenalmadenaScraper(benalmadena_url)
-    data_benalmadena = b_scraper.scrape()
+def parse_port(port_name: str, html: str) -> Iterator[TariffRecord]:
+    """
+    Parsea una página ya descargada con el scraper del puerto.
+    """
+    scraper_cls, url = SCRAPERS[port_name]
+    return scraper_cls(url).parse(html)
 
-    m_scraper = MarbellaScraper(marbella_url)
-    data_marbella = m_scraper.scrape()
 
-    # unimos:
-    return data_benalmadena + data_marbella
-    #return data_benalmadena
+def scrape_port(port_name: str) -> Iterator[TariffRecord]:
+    """
+    Ejecuta el scraper de un único puerto registrado en SCRAPERS.
+    La página se descarga aquí; las filas se parsean al consumir el generador.
+    """
+    scraper_cls, url = SCRAPERS[port_name]
+    return scraper_cls(url).scrape()
+
+
+def run_scrapers(ports: Optional[List[str]] = None) -> Iterator[TariffRecord]:
+    """
+    Ejecuta los scrapers de los puertos indicados (por defecto, todos)
+    y encadena sus registros, un puerto detrás de otro y sin listas intermedias.
+    """
+    return chain.from_iterable(scrape_port(port_name) for port_name in (ports or list(SCRAPERS)))
+
+
+def run_all_scrapers():
+    return run_scrapers()
@@ -0,0 +1,36 @@
+# tests/test_tariff_cache.py
+from backend.tariff_cache import TariffTable
+
+
+def _band(length_max, beam_max, price):
+    return {"port_name": "Benalmadena", "boat_length_min": 0, "boat_length_max": length_max,
+            "beam_max": beam_max, "price_low_season": price, "price_high_season": price,
+            "t0_daily": 0, "iva_rate": 0.21}
+
+
+TABLE = TariffTable.from_rows([_band(8, 3.0, 10), _band(10, 4.5, 15), _band(12, 4.0, 14)], version=1)
+
+
+def test_fitting_band_has_no_surcharge():
+    row = TABLE.find("Benalmadena", 9, 4.2)
+    assert row["boat_length_max"] == 10
+    assert "oversize_ratio" not in row
+
+
+def test_too_wide_but_not_too_long_takes_widest_band_with_beam_surcharge():
+    # Wider than every band, shorter than the largest: not the 12 m x 4.0 m band at 14/day
+    row = TABLE.find("Benalmadena", 9, 4.6)
+    assert (row["boat_length_max"], row["beam_max"]) == (10, 4.5)
+    assert row["oversize_ratio"] == round(4.6 / 4.5, 4)
+    assert row["price_low_season"] > 15
+
+
+def test_too_long_multiplies_length_and_beam_excess():
+    row = TABLE.find("Benalmadena", 13, 4.4)
+    assert row["boat_length_max"] == 12
+    assert row["oversize_ratio"] == round(13 / 12 * 4.4 / 4.0, 4)
+
+
+def test_beyond_max_oversize_is_not_quoted():
+    assert TABLE.find("Benalmadena", 9, 6.0) is None
+    assert TABLE.find("Benalmadena", 20) is None